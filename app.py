@@ -1,45 +1,98 @@
-from flask import Flask, request, jsonify
+"""Application factory.
+
+``create_app()`` builds an app with the blueprints named in APP_BLUEPRINTS
+(comma-separated, default: all of them). For example, a pool of
+randomization-only workers can run with ``APP_BLUEPRINTS=auth,randomization``.
+A blueprint's module is imported only when the blueprint is registered, so
+a smaller app also starts faster. Tests can pass ``config`` overrides and
+get a fresh app per test.
+
+``gunicorn app:app`` and ``flask --app app`` still work: the module-level
+``app`` is built on first access.
+"""
+from flask import Flask, current_app, request, jsonify
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-from functools import wraps
-from flask_jwt_extended import (
-    JWTManager, jwt_required, create_access_token,
-    get_jwt_identity
-)
+from flask_jwt_extended import JWTManager
+from datetime import timedelta
+from importlib import import_module
 import os
-from models import db, Users, Site, StudySite, Patient  # ✅ instead of from app
-from routes.users import users_bp
-from routes.sites import sites_bp
-from routes.studies import studies_bp
-from routes.patients import patients_bp
-
-# App setup
-app = Flask(__name__)
-
-# JWT & DB Configuration
-app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
-app.config["JWT_SECRET_KEY"] = app.config["SECRET_KEY"]
-app.config["JWT_TOKEN_LOCATION"] = ["headers"]
-app.config["JWT_HEADER_NAME"] = "Authorization"
-app.config["JWT_HEADER_TYPE"] = "Bearer"
-app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=2)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///local.db").replace("postgres://", "postgresql://")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Init extensions
-db.init_app(app)
-jwt = JWTManager(app)
-CORS(app, resources={r"/*": {"origins": ["https://rctmanager.com"]}})
-
-# Register blueprints
-app.register_blueprint(users_bp)
-app.register_blueprint(sites_bp)
-app.register_blueprint(studies_bp)
-app.register_blueprint(patients_bp)
-
-# Database Models
+from models import db  # ✅ instead of from app
+from commands import randomization_cli, perf_cli
+from json_provider import JSONProvider
+from db_pool import engine_options, instrument
+import metrics
+import passwords
+from auth import token_revoked
+
+# name -> "module:attribute", imported on registration
+BLUEPRINTS = {
+    "auth": "routes.auth:auth_bp",
+    "users": "routes.users:users_bp",
+    "sites": "routes.sites:sites_bp",
+    "studies": "routes.studies:studies_bp",
+    "patients": "routes.patients:patients_bp",
+    "randomization": "routes.randomization:randomization_bp",
+    "admin": "routes.admin:admin_bp",
+}
+
+jwt = JWTManager()
+
+
+def _env_config():
+    secret_key = os.environ.get("SECRET_KEY", "dev-secret")
+    return {
+        # JWT & DB Configuration
+        "SECRET_KEY": secret_key,
+        "JWT_SECRET_KEY": secret_key,
+        "JWT_TOKEN_LOCATION": ["headers"],
+        "JWT_HEADER_NAME": "Authorization",
+        "JWT_HEADER_TYPE": "Bearer",
+        "JWT_ACCESS_TOKEN_EXPIRES": timedelta(hours=2),
+        "SQLALCHEMY_DATABASE_URI": os.environ.get("DATABASE_URL", "sqlite:///local.db").replace("postgres://", "postgresql://"),
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "STUDY_SEARCH": os.environ.get("STUDY_SEARCH", "indexed"),  # indexed | ilike (see search.py)
+        "BLUEPRINTS": [name.strip() for name in os.environ.get("APP_BLUEPRINTS", ",".join(BLUEPRINTS)).split(",") if name.strip()],
+        # Flask-Migrate pulls in alembic; web workers never run migrations (gunicorn.conf.py sets APP_MIGRATE=0)
+        "MIGRATE": os.environ.get("APP_MIGRATE", "1").lower() in ("1", "true", "yes", "on"),
+    }
+
+
+def create_app(config=None):
+    """Build the app. ``config`` overrides the environment-derived settings."""
+    app = Flask(__name__)
+    app.json = JSONProvider(app)
+    app.config.update(_env_config())
+    app.config.update(config or {})
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"]))
+
+    unknown = set(app.config["BLUEPRINTS"]) - set(BLUEPRINTS)
+    if unknown:
+        raise ValueError(f"Unknown blueprints: {', '.join(sorted(unknown))}")
+
+    # Init extensions
+    db.init_app(app)
+    with app.app_context():
+        instrument(db.engine)
+        metrics.init_app(app, db.engine)
+    passwords.init_app(app)
+    if app.config["MIGRATE"]:
+        from flask_migrate import Migrate
+        Migrate(app, db, render_as_batch=True)
+    jwt.init_app(app)
+    CORS(app, resources={r"/*": {"origins": ["https://rctmanager.com"]}})
+
+    # Register blueprints
+    for name in app.config["BLUEPRINTS"]:
+        module, attr = BLUEPRINTS[name].split(":")
+        app.register_blueprint(getattr(import_module(module), attr))
+
+    # CLI commands
+    app.cli.add_command(randomization_cli)
+    app.cli.add_command(perf_cli)
+
+    app.before_request(handle_options_request)
+    return app
+
 
 # JWT error handlers
 @jwt.unauthorized_loader
@@ -54,61 +107,34 @@ def handle_invalid_token(error):
 def handle_expired_token(jwt_header, jwt_payload):
     return jsonify({"success": False, "message": "Token has expired!"}), 401
 
+# Password, role and membership changes bump Users.token_version; older tokens stop working
+jwt.token_in_blocklist_loader(token_revoked)
+
+@jwt.revoked_token_loader
+def handle_revoked_token(jwt_header, jwt_payload):
+    return jsonify({"success": False, "message": "Token has been revoked!"}), 401
+
 # Routes
-@app.before_request
 def handle_options_request():
     if request.method == "OPTIONS":
-        response = app.make_default_options_response()
+        response = current_app.make_default_options_response()
         headers = response.headers
         headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
         headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
         return response
 
-@app.route("/login", methods=["POST"])
-def login():
-    data = request.get_json()
-    user = Users.query.filter_by(username=data["username"]).first()
-    if user and check_password_hash(user.password, data["password"]):
-        access_token = create_access_token(identity=str(user.id))  # ✅ Use flask_jwt_extended
-        return jsonify({"success": True, "role": user.role, "token": access_token})
-    return jsonify({"success": False, "message": "Invalid credentials"}), 401
-
-#user
-@app.route("/users", methods=["POST"])
-@jwt_required()
-def create_user():
-    user_id = get_jwt_identity()
-    current_user = Users.query.get(user_id)
-    if current_user.role != "admin":
-        return jsonify({"success": False, "message": "Access denied"}), 403
-    data = request.get_json()
-    hashed_pw = generate_password_hash(data["password"])
-    new_user = Users(username=data["username"], password=hashed_pw, role=data["role"])
-    db.session.add(new_user)
-    db.session.commit()
-    return jsonify({"success": True, "message": "User created successfully."})
-
-@app.route('/change-password', methods=['POST'])
-@jwt_required()
-def change_password():
-    data = request.get_json()
-    old_pw = data.get('oldPassword')
-    new_pw = data.get('newPassword')
-    if not old_pw or not new_pw:
-        return jsonify({"success": False, "message": "Missing password fields"}), 400
-
-    user = Users.query.get(get_jwt_identity())
-    if not user or not check_password_hash(user.password, old_pw):
-        return jsonify({"success": False, "message": "Incorrect old password"}), 400
-
-    user.password = generate_password_hash(new_pw)
-    db.session.commit()
-    return jsonify({"success": True, "message": "Password updated successfully"})
 
+def __getattr__(name):
+    # `gunicorn app:app`, `flask --app app` and `from app import app` look the app up by name
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Initialize tables
 if __name__ == "__main__":
+    app = create_app()
     with app.app_context():
         db.create_all()
     app.run(debug=True)
@@ -0,0 +1,139 @@
+# auth.py
+import os
+from collections import namedtuple
+from functools import wraps
+from threading import Lock
+
+from flask import g, jsonify
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from models import db, Users, StudyUser
+from cache import Cache
+
+# Lightweight snapshot of the caller: enough to authorize, never the password hash
+CurrentUser = namedtuple("CurrentUser", ["id", "role", "study_ids"])
+
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", 300))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 4096))
+# Kept short: without a shared cache, or while it is down, this is how long another worker may keep
+# accepting a revoked token (see CACHE_RETRY_AFTER in cache.py)
+TOKEN_VERSION_TTL = int(os.environ.get("TOKEN_VERSION_TTL", 30))
+
+_user_cache = Cache("auth-user", maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+_version_cache = Cache("token-version", maxsize=AUTH_CACHE_SIZE, ttl=TOKEN_VERSION_TTL)
+_lock = Lock()
+_stats = {"hits": 0, "misses": 0, "claims": 0, "revoked": 0}
+
+
+def _study_ids(user_id):
+    return frozenset(
+        sid for (sid,) in db.session.query(StudyUser.study_id).filter(StudyUser.user_id == user_id)
+    )
+
+
+def _load_user(user_id):
+    user = Users.query.get(user_id)
+    if not user:
+        return None
+    return CurrentUser(user.id, user.role, _study_ids(user.id))
+
+
+def build_claims(user):
+    """Signed claims written into the access token at login."""
+    return {
+        "role": user.role,
+        "studies": sorted(_study_ids(user.id)),
+        "ver": user.token_version or 0,
+    }
+
+
+def current_token_version(user_id):
+    version = _version_cache.get(user_id)
+    if version is None:
+        version = db.session.query(Users.token_version).filter(Users.id == user_id).scalar() or 0
+        _version_cache.set(user_id, version)
+    return version
+
+
+def token_revoked(jwt_header, jwt_payload):
+    """Blocklist check run by jwt_required() on every request.
+
+    A token is revoked once its ``ver`` claim falls behind the user's
+    token_version, i.e. after a password, role or study membership change.
+    """
+    revoked = jwt_payload.get("ver", 0) != current_token_version(int(jwt_payload["sub"]))
+    if revoked:
+        with _lock:
+            _stats["revoked"] += 1
+    return revoked
+
+
+def _user_from_claims(user_id):
+    claims = get_jwt()
+    if "role" not in claims:
+        return None  # token minted before claims were added
+    with _lock:
+        _stats["claims"] += 1
+    return CurrentUser(user_id, claims["role"], frozenset(claims.get("studies", [])))
+
+
+def get_current_user():
+    """Return the caller as a CurrentUser, loading it at most once per request.
+
+    Token claims are used as-is (token_revoked() has already rejected stale
+    ones); claim-less tokens fall back to the cached database lookup.
+    """
+    if "current_user" in g:
+        return g.current_user
+
+    user_id = int(get_jwt_identity())
+    user = _user_from_claims(user_id)
+    if user is None:
+        user = _user_cache.get(user_id)
+        with _lock:
+            _stats["hits" if user else "misses"] += 1
+
+        if user is None:
+            user = _load_user(user_id)
+            if user:
+                _user_cache.set(user_id, user)
+
+    g.current_user = user
+    return user
+
+
+def bump_token_version(*user_ids):
+    """Revoke every token already issued to these users. Caller commits."""
+    if user_ids:
+        Users.query.filter(Users.id.in_([int(uid) for uid in user_ids])).update(
+            {Users.token_version: Users.token_version + 1}, synchronize_session=False
+        )
+
+
+def invalidate_user(*user_ids):
+    """Drop cached users, in every worker, after their role, password or study memberships change."""
+    user_ids = [int(uid) for uid in user_ids]
+    _user_cache.delete(*user_ids)
+    _version_cache.delete(*user_ids)
+    if g.get("current_user") and g.current_user.id in user_ids:
+        g.pop("current_user")
+
+
+def auth_cache_stats():
+    with _lock:
+        return {**_stats, "size": len(_user_cache), "ttl": AUTH_CACHE_TTL}
+
+
+def roles_required(*roles):
+    """jwt_required() plus a role check against the current user's claims."""
+    def decorator(fn):
+        @wraps(fn)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            current_user = get_current_user()
+            if not current_user:
+                return jsonify({"message": "User not found"}), 404
+            if roles and current_user.role not in roles:
+                return jsonify({"message": "Access denied"}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
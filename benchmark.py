@@ -0,0 +1,784 @@
+# benchmark.py
+"""Reproducible load test of the real Flask app.
+
+Seeds a database with synthetic studies, sites, users, patients and EAV
+variables, mints JWTs, then drives the app in-process through its test
+client. For each scenario it reports p50/p95/p99 latency, throughput and SQL
+statements per request.
+
+Results are JSON files tagged with the git commit, so two commits can be
+compared (``--compare``) to catch performance regressions:
+
+    python benchmark.py                                  # bench-results/<commit>.json
+    python benchmark.py --compare bench-results/<older commit>.json
+
+Defaults to a throw-away SQLite file. ``--database-url`` points it at
+PostgreSQL instead; that database must be empty, or be wiped with ``--reset``.
+
+``--server sync|gthread|gevent`` runs the scenarios over HTTP against gunicorn
+(gunicorn.conf.py) with that worker class, for comparing deployment modes
+under many concurrent clients:
+
+    python benchmark.py --server sync   --scenarios studies_page,get_patient --concurrency 500 --requests 5000
+    python benchmark.py --server gevent --scenarios studies_page,get_patient --concurrency 500 --requests 5000
+
+SQL statements happen inside the server processes and are not counted in
+this mode.
+
+``--startup`` instead times a cold ``import app`` plus ``create_app()`` in
+fresh interpreters, for all blueprints and for a randomization-only worker.
+
+Sweeps repeat one request type while a single parameter grows, and report
+latency per value instead of per scenario. ``--search-scale`` grows the
+study table (default 10k, 100k, then 1M rows) and times study search with
+the index (pg_trgm / FTS5) against the plain ILIKE fallback:
+
+    python benchmark.py --search-scale
+    python benchmark.py --search-scale 10000,100000 --requests 100
+
+``--bulk-import`` streams one CSV and one NDJSON file of that many patients
+(default 100k) with ``--variables`` values each through /api/patients/bulk,
+and reports the wall time of each import:
+
+    python benchmark.py --bulk-import --variables 50
+
+``--patient-variables`` times POST /api/patients with 10, 100 and 1000
+variables against the per-object ORM path it replaced (one PatientVariable
+object per value plus a flush), which is mounted for the sweep only:
+
+    python benchmark.py --patient-variables
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+SCENARIOS = (
+    "login", "users", "studies_page", "studies_search", "studies_cursor", "assigned_studies", "sites",
+    "variables", "create_patient", "get_patient", "randomize", "metrics",
+)
+PASSWORD = "bench-password"
+HERE = os.path.dirname(os.path.abspath(__file__))
+PERCENTILES = (50, 95, 99)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", help="Default: a new SQLite file in a temp directory.")
+    parser.add_argument("--reset", action="store_true", help="Drop every table in --database-url first.")
+    parser.add_argument("--studies", type=int, default=50)
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--patients", type=int, default=200, help="Patients per study.")
+    parser.add_argument("--variables", type=int, default=10, help="EAV variables per study.")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario.")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Client threads per scenario, e.g. a login storm: --scenarios login --concurrency 32.")
+    parser.add_argument("--server", choices=("sync", "gthread", "gevent"),
+                        help="Drive gunicorn over HTTP with this worker class instead of the in-process test client.")
+    parser.add_argument("--workers", type=int, default=2, help="Gunicorn workers with --server.")
+    parser.add_argument("--startup", type=int, metavar="RUNS", nargs="?", const=10,
+                        help="Measure cold import and create_app() time instead of the load test (default 10 runs).")
+    parser.add_argument("--search-scale", metavar="SIZES", nargs="?", const="10000,100000,1000000",
+                        help="Sweep: study search latency, indexed vs ILIKE, at these study counts "
+                             "(default 10000,100000,1000000).")
+    parser.add_argument("--bulk-import", metavar="ROWS", nargs="?", const="100000",
+                        help="Sweep: one CSV and one NDJSON bulk import of this many patients, each with "
+                             "--variables values (default 100000).")
+    parser.add_argument("--patient-variables", metavar="COUNTS", nargs="?", const="10,100,1000",
+                        help="Sweep: create_patient, core insert vs per-object ORM, with this many "
+                             "variables (default 10,100,1000).")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset to run.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON here (default: bench-results/<commit>.json).")
+    parser.add_argument("--compare", help="Earlier results JSON to diff against.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative p95 slowdown counted as a regression (default 10%%).")
+    return parser.parse_args(argv)
+
+
+# --- Environment ---
+
+def git_commit():
+    here = HERE
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short=12", "HEAD"], cwd=here,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                               capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_app(database_url):
+    os.environ.setdefault("SLOW_REQUEST_MS", "1000000")  # keep the slow-request log quiet
+    os.environ.pop("METRICS_TOKEN", None)
+    from app import create_app
+    # gunicorn workers in --server mode read the same settings from the environment
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.pop("APP_BLUEPRINTS", None)
+    return create_app({"SQLALCHEMY_DATABASE_URI": database_url, "MIGRATE": True})
+
+
+# --- Startup ---
+
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+print(imported - started, time.perf_counter() - imported)
+"""
+
+# label -> environment; APP_BLUEPRINTS unset means every blueprint
+STARTUP_VARIANTS = {
+    "all+migrate": {"APP_MIGRATE": "1"},  # what `flask db upgrade` and the CLI pay
+    "all": {"APP_MIGRATE": "0"},  # a gunicorn worker
+    "randomization": {"APP_MIGRATE": "0", "APP_BLUEPRINTS": "auth,randomization"},
+}
+
+
+def startup_benchmark(runs):
+    """Median cold-start times per variant, each run in a fresh interpreter."""
+    results = {}
+    for label, variant in STARTUP_VARIANTS.items():
+        env = {k: v for k, v in os.environ.items() if k != "APP_BLUEPRINTS"}
+        env.update(DATABASE_URL="sqlite://", **variant)
+        imports, boots, totals = [], [], []
+        for _ in range(runs):
+            started = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=HERE, env=env,
+                                 capture_output=True, text=True, check=True).stdout.split()
+            totals.append(time.perf_counter() - started)
+            imports.append(float(out[0]))
+            boots.append(float(out[1]))
+        results[label] = {
+            "import_ms": round(statistics.median(imports) * 1000, 1),
+            "create_app_ms": round(statistics.median(boots) * 1000, 1),
+            "process_ms": round(statistics.median(totals) * 1000, 1),
+        }
+    return results
+
+
+# --- Seeding ---
+
+def prepare_database(app, reset):
+    from flask_migrate import upgrade
+    from models import db, Users
+
+    with app.app_context():
+        if reset:
+            db.drop_all()
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql("DROP TABLE IF EXISTS alembic_version")
+        upgrade(directory=os.path.join(HERE, "migrations"))
+        if db.session.query(Users.id).first():
+            sys.exit("Database is not empty; use a fresh database or --reset.")
+
+
+def study_rows(ids, now):
+    return [
+        {"id": i, "name": f"Study {i} hypertension", "protocol_number": f"PRT-{i:05d}",
+         "irb_number": f"IRB-{i:05d}", "start_date": date(2024, 1, 1),
+         "end_date": date.today() + timedelta(days=365) if i % 5 else None,
+         "created_by": 1, "is_randomized": True, "randomization_type": "block", "block_size": 4,
+         "timestamp_created": now - timedelta(minutes=i), "timestamp_updated": now}
+        for i in ids
+    ]
+
+
+def seed_admin(app):
+    """Just the admin user, for sweeps that seed their own data."""
+    from passwords import hash_password
+    from models import db, Users
+
+    with app.app_context():
+        db.session.add(Users(id=1, username="user1", password=hash_password(PASSWORD), role="admin"))
+        db.session.commit()
+
+
+def seed(app, args, rng):
+    """Insert the synthetic data set with core executemany inserts; returns ids the scenarios need."""
+    from passwords import hash_password
+    from models import (db, Users, Site, Study, StudySite, StudyUser, TreatmentArm, StudyVariable,
+                        Patient, PatientVariable)
+
+    now = datetime.utcnow()
+    hashed = hash_password(PASSWORD)  # hashing is slow; every user shares one hash
+    tables = {}
+
+    def insert(model, rows):
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+        tables[model.__tablename__] = tables.get(model.__tablename__, 0) + len(rows)
+
+    with app.app_context():
+        insert(Users, [
+            {"id": i, "username": f"user{i}", "password": hashed,
+             "role": "admin" if i == 1 else ("studymanager" if i % 10 == 0 else "investigator"),
+             "first_name": f"First{i}", "last_name": f"Last{i}", "title": "Dr"}
+            for i in range(1, args.users + 1)
+        ])
+        insert(Site, [
+            {"id": i, "name": f"Site {i}", "location": f"City {i % 7}", "timestamp_created": now}
+            for i in range(1, args.sites + 1)
+        ])
+        insert(Study, study_rows(range(1, args.studies + 1), now))
+
+        study_sites, study_users, arms, variables = [], [], [], []
+        for study_id in range(1, args.studies + 1):
+            for site_id in rng.sample(range(1, args.sites + 1), min(3, args.sites)):
+                study_sites.append({"study_id": study_id, "site_id": site_id, "created_by": 1,
+                                    "timestamp_created": now, "timestamp_updated": now})
+            for user_id in rng.sample(range(2, args.users + 1), min(5, args.users - 1)):
+                study_users.append({"study_id": study_id, "user_id": user_id, "created_by": 1,
+                                    "timestamp_created": now})
+            for name in ("Control", "Treatment"):
+                arms.append({"study_id": study_id, "name": name, "allocation_ratio": 1, "created_by": 1,
+                             "timestamp_created": now})
+            for v in range(args.variables):
+                variables.append({"study_id": study_id, "name": f"var{v}", "variable_type": "number",
+                                  "required": False, "created_by": 1, "updated_by": 1,
+                                  "timestamp_created": now, "timestamp_updated": now})
+        insert(StudySite, study_sites)
+        insert(StudyUser, study_users)
+        insert(TreatmentArm, arms)
+        insert(StudyVariable, variables)
+
+        variable_ids = {}
+        for variable_id, study_id in db.session.query(StudyVariable.id, StudyVariable.study_id):
+            variable_ids.setdefault(study_id, []).append(variable_id)
+
+        patient_id = 0
+        for study_id in range(1, args.studies + 1):
+            patients, values = [], []
+            for _ in range(args.patients):
+                patient_id += 1
+                patients.append({
+                    "id": patient_id, "study_id": study_id, "site_id": rng.randint(1, args.sites),
+                    "name": f"Patient {patient_id}", "dob": date(1960, 1, 1) + timedelta(days=rng.randint(0, 15000)),
+                    "sex": rng.choice("FM"), "para": str(rng.randint(0, 4)), "is_active": True,
+                    "entered_by": 1, "updated_by": 1, "timestamp_created": now, "timestamp_updated": now,
+                })
+                values += [
+                    {"patient_id": patient_id, "variable_id": variable_id, "value": str(rng.randint(60, 200)),
+                     "created_by": 1, "updated_by": 1, "timestamp_created": now, "timestamp_updated": now}
+                    for variable_id in variable_ids.get(study_id, [])
+                ]
+            insert(Patient, patients)
+            insert(PatientVariable, values)
+        db.session.commit()
+
+        study_members = {}
+        for study_id, user_id in db.session.query(StudyUser.study_id, StudyUser.user_id):
+            study_members.setdefault(user_id, []).append(study_id)
+
+    return {"tables": tables, "patients": patient_id, "variable_ids": variable_ids, "members": study_members}
+
+
+def mint_tokens(app, user_ids):
+    from flask_jwt_extended import create_access_token
+    from auth import build_claims
+    from models import db, Users
+
+    with app.app_context():
+        return {
+            user.id: create_access_token(identity=str(user.id), additional_claims=build_claims(user))
+            for user in db.session.query(Users).filter(Users.id.in_(user_ids))
+        }
+
+
+# --- HTTP mode ---
+
+class HttpClient:
+    """The slice of Flask's test client the scenarios use, over keep-alive HTTP connections."""
+
+    def __init__(self, port):
+        self.port = port
+        self._local = threading.local()
+
+    def get(self, url, headers=None, json=None):
+        return self._request("GET", url, headers, json)
+
+    def post(self, url, headers=None, json=None):
+        return self._request("POST", url, headers, json)
+
+    def _request(self, method, url, headers, payload):
+        headers = dict(headers or {})
+        body = None
+        if payload is not None:
+            body = json.dumps(payload)
+            headers["Content-Type"] = "application/json"
+        reused = getattr(self._local, "conn", None)
+        conn = reused or http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+        try:
+            conn.request(method, url, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            if reused:  # the server closed an idle keep-alive connection; retry on a fresh one
+                return self._request(method, url, headers, payload)
+            return SimpleNamespace(status_code=599)
+        if response.will_close:  # sync workers close after every response
+            conn.close()
+            conn = None
+        self._local.conn = conn
+        return SimpleNamespace(status_code=response.status)
+
+
+@contextmanager
+def gunicorn(worker_class, workers, database_url):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = {**os.environ, "DATABASE_URL": database_url, "WORKER_CLASS": worker_class,
+           "WEB_CONCURRENCY": str(workers)}
+    log = tempfile.TemporaryFile()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+         "--backlog", "2048", "app:app"],
+        cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            if server.poll() is not None or time.monotonic() > deadline:
+                log.seek(0)
+                sys.exit(f"gunicorn did not start:\n{log.read().decode(errors='replace')[-2000:]}")
+            try:
+                if HttpClient(port).get("/metrics").status_code == 200:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.2)
+        yield HttpClient(port)
+    finally:
+        server.terminate()
+        server.wait(30)
+        log.close()
+
+
+# --- Scenarios ---
+
+def build_scenarios(args, data, tokens, rng):
+    """Each scenario returns the next ``(method, url, token, json body)``."""
+    admin = tokens[1]
+    members = sorted(data["members"])
+    unrandomized = iter(range(1, data["patients"] + 1))
+
+    def patient_body():
+        study_id = rng.randint(1, args.studies)
+        return {
+            "study_id": study_id, "site_id": rng.randint(1, args.sites), "name": "Bench Patient",
+            "dob": "1985-06-01", "sex": "F", "para": "1",
+            "study_variables": [{"variable_id": v, "value": "120"} for v in data["variable_ids"].get(study_id, [])],
+        }
+
+    def randomize():
+        patient_id = next(unrandomized)
+        study_id = (patient_id - 1) // args.patients + 1
+        return "post", "/api/randomize", admin, {"study_id": study_id, "patient_id": patient_id}
+
+    return {
+        "login": lambda: ("post", "/login", None,
+                          {"username": f"user{rng.randint(1, args.users)}", "password": PASSWORD}),
+        "users": lambda: ("get", "/api/users/", admin, None),
+        "studies_page": lambda: ("get", f"/api/studies?page={rng.randint(1, max(args.studies // 10, 1))}&limit=10",
+                                 admin, None),
+        "studies_search": lambda: ("get", f"/api/studies?search=Study {rng.randint(1, args.studies)}", admin, None),
+        "studies_cursor": lambda: ("get", "/api/studies?cursor=&limit=20", admin, None),
+        "assigned_studies": lambda: ("get", "/api/studies/assigned-studies", tokens[rng.choice(members)], None),
+        "sites": lambda: ("get", "/api/sites", admin, None),
+        "variables": lambda: ("get", f"/api/studies/{rng.randint(1, args.studies)}/variables", admin, None),
+        "create_patient": lambda: ("post", "/api/patients", admin, patient_body()),
+        "get_patient": lambda: ("get", f"/api/patients/{rng.randint(1, data['patients'])}", admin, None),
+        "randomize": randomize,
+        "metrics": lambda: ("get", "/metrics", None, None),
+    }
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def run_scenario(client, next_request, count, warmup, queries, concurrency=1):
+    """Send ``warmup`` then ``count`` requests from ``concurrency`` threads.
+
+    Requests are built up front on this thread so the sequence does not
+    depend on scheduling. Statements are counted per request when
+    sequential, and averaged over the run when concurrent.
+    """
+    planned = [next_request() for _ in range(warmup + count)]
+
+    def send(request):
+        method, url, token, body = request
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        before = queries[0]
+        started = time.perf_counter()
+        status = getattr(client, method)(url, headers=headers, json=body).status_code
+        return time.perf_counter() - started, queries[0] - before, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, planned[:warmup]))
+        before, started = queries[0], time.perf_counter()
+        measured = list(executor.map(send, planned[warmup:]))
+        wall, statements = time.perf_counter() - started, queries[0] - before
+
+    latencies = sorted(elapsed for elapsed, _, _ in measured)
+    if concurrency == 1:
+        wall = sum(latencies)
+    return {
+        "requests": count,
+        "concurrency": concurrency,
+        "errors": sum(status >= 400 for _, _, status in measured),
+        "shed_503": sum(status == 503 for _, _, status in measured),
+        **{f"p{p}_ms": round(percentile(latencies, p) * 1000, 3) for p in PERCENTILES},
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "throughput_rps": round(count / wall, 1) if wall else None,
+        "queries_per_request": round(statements / count, 2),
+    }
+
+
+# --- Sweeps ---
+
+SEED_CHUNK = 50000
+
+
+def search_scale(app, client, token, sizes, args, rng, queries):
+    """Grow the study table through ``sizes`` and time search, indexed and ILIKE, at each size."""
+    from models import db, Study
+
+    results, seeded, now = {}, 0, datetime.utcnow()
+    for size in sorted(sizes):
+        started = time.perf_counter()
+        with app.app_context():
+            for first in range(seeded + 1, size + 1, SEED_CHUNK):
+                db.session.execute(Study.__table__.insert(), study_rows(range(first, min(first + SEED_CHUNK, size + 1)), now))
+                db.session.commit()
+        print(f"seeded {size} studies in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        seeded = size
+
+        # Distinct terms throughout, so no response is served from the response cache
+        per_variant = args.warmup + args.requests
+        numbers = iter(rng.sample(range(1, size + 1), min(size, 2 * per_variant)) * 2)
+        results[str(size)] = {}
+        for variant in ("indexed", "ilike"):
+            app.config["STUDY_SEARCH"] = variant
+            results[str(size)][variant] = run_scenario(
+                client, lambda: ("get", f"/api/studies?search=Study {next(numbers)}&limit=10", token, None),
+                args.requests, args.warmup, queries,
+            )
+        app.config["STUDY_SEARCH"] = "indexed"
+    return results
+
+
+def single_run(elapsed, statements, status, **extra):
+    """A run_scenario()-shaped result for one long request."""
+    ms = round(elapsed * 1000, 3)
+    return {
+        "requests": 1, "concurrency": 1, "errors": int(status >= 400), "shed_503": int(status == 503),
+        **{f"p{p}_ms": ms for p in PERCENTILES}, "mean_ms": ms,
+        "throughput_rps": round(1 / elapsed, 3) if elapsed else None,
+        "queries_per_request": statements, **extra,
+    }
+
+
+def seed_study(app, variables):
+    """One study with a linked site and ``variables`` number variables; returns its id, site id and variable ids."""
+    from models import db, Site, Study, StudySite, StudyVariable
+
+    with app.app_context():
+        study, site = Study(name="Sweep study", created_by=1), Site(name="Sweep site")
+        db.session.add_all([study, site])
+        db.session.flush()
+        db.session.add(StudySite(study_id=study.id, site_id=site.id, created_by=1))
+        rows = [StudyVariable(study_id=study.id, name=f"var{v}", variable_type="number", created_by=1)
+                for v in range(variables)]
+        db.session.add_all(rows)
+        db.session.commit()
+        return study.id, site.id, [row.id for row in rows]
+
+
+def _import_file(fmt, rows, site_id, variable_ids, rng):
+    """Write a bulk-import payload to a temp file, without holding it in memory."""
+    f = tempfile.TemporaryFile()
+    names = [f"var{v}" for v in range(len(variable_ids))]
+    if fmt == "csv":
+        f.write((",".join(["name", "dob", "sex", "para", "site_id", *names]) + "\n").encode())
+    for i in range(rows):
+        values = [str(rng.randint(60, 200)) for _ in variable_ids]
+        if fmt == "csv":
+            line = ",".join([f"Patient {i}", "1980-06-01", rng.choice("FM"), str(i % 5), str(site_id), *values])
+        else:
+            line = json.dumps({
+                "name": f"Patient {i}", "dob": "1980-06-01", "sex": rng.choice("FM"), "para": str(i % 5),
+                "site_id": site_id,
+                "study_variables": [{"variable_id": v, "value": value} for v, value in zip(variable_ids, values)],
+            })
+        f.write(line.encode() + b"\n")
+    size = f.tell()
+    f.seek(0)
+    return f, size
+
+
+def bulk_import(app, client, token, sizes, args, rng, queries):
+    """Time one streamed CSV and one NDJSON import per size."""
+    study_id, site_id, variable_ids = seed_study(app, args.variables)
+    results = {}
+    for rows in sizes:
+        results[str(rows)] = {}
+        for fmt, mimetype in (("csv", "text/csv"), ("ndjson", "application/x-ndjson")):
+            payload, size = _import_file(fmt, rows, site_id, variable_ids, rng)
+            with payload:
+                before, started = queries[0], time.perf_counter()
+                response = client.post(f"/api/patients/bulk?study_id={study_id}&format={fmt}",
+                                       headers={"Authorization": f"Bearer {token}"},
+                                       input_stream=payload, content_length=size, content_type=mimetype)
+                elapsed = time.perf_counter() - started
+            body = response.get_json() or {}
+            print(f"{fmt}: {body.get('inserted')} of {rows} patients x {len(variable_ids)} variables "
+                  f"in {elapsed:.1f}s", file=sys.stderr)
+            results[str(rows)][fmt] = single_run(
+                elapsed, queries[0] - before, response.status_code,
+                inserted=body.get("inserted"), failed=body.get("failed"),
+                rows_per_second=round(rows / elapsed) if elapsed else None, payload_mib=round(size / 2**20, 1),
+            )
+    return results
+
+
+PER_OBJECT_URL = "/bench/per-object-patient"
+
+
+def mount_per_object_patient(app):
+    """The create_patient write path before core inserts, for comparison. Must run before the first request."""
+    from flask import request, jsonify
+    from flask_jwt_extended import jwt_required, get_jwt_identity
+    from models import db, Patient, PatientVariable
+    from routes.patients import _as_date
+
+    @jwt_required()
+    def per_object_patient():
+        data = request.get_json()
+        user_id = get_jwt_identity()
+        now = datetime.utcnow()
+        patient = Patient(
+            name=data.get("name"), dob=_as_date(data.get("dob")), sex=data.get("sex"), para=data.get("para"),
+            study_id=data.get("study_id"), site_id=data.get("site_id"), is_active=True,
+            entered_by=user_id, updated_by=user_id, timestamp_created=now, timestamp_updated=now,
+        )
+        db.session.add(patient)
+        db.session.flush()
+        for var in data.get("study_variables", []):
+            db.session.add(PatientVariable(
+                patient_id=patient.id, variable_id=var.get("variable_id"), value=var.get("value"),
+                created_by=user_id, updated_by=user_id, timestamp_created=now, timestamp_updated=now,
+            ))
+        db.session.commit()
+        return jsonify({"id": patient.id}), 201
+
+    app.add_url_rule(PER_OBJECT_URL, "bench_per_object_patient", per_object_patient, methods=["POST"])
+
+
+def patient_variables(app, client, token, counts, args, rng, queries):
+    """Time create_patient per variable count, core insert vs the per-object path."""
+    results = {}
+    for count in counts:
+        study_id, site_id, variable_ids = seed_study(app, count)
+        results[str(count)] = {}
+        for variant, url in (("core", "/api/patients"), ("per_object", PER_OBJECT_URL)):
+            body = lambda: {
+                "study_id": study_id, "site_id": site_id, "name": "Bench Patient", "dob": "1985-06-01",
+                "sex": "F", "para": "1",
+                "study_variables": [{"variable_id": v, "value": str(rng.randint(60, 200))} for v in variable_ids],
+            }
+            results[str(count)][variant] = run_scenario(
+                client, lambda: ("post", url, token, body()), args.requests, args.warmup, queries
+            )
+    return results
+
+
+def _sizes(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+# --- Reporting ---
+
+def _rows(results):
+    """Scenario results plus every sweep point, flattened to ``{name: result}``."""
+    rows = dict(results.get("scenarios", {}))
+    for sweep, points in results.get("sweeps", {}).items():
+        for value, variants in points.items():
+            for variant, result in variants.items():
+                rows[f"{sweep}[{value}] {variant}"] = result
+    return rows
+
+
+def print_table(results):
+    if "startup" in results:
+        print(f"{'variant':<18}{'import ms':>12}{'create_app ms':>15}{'process ms':>12}")
+        for name, r in results["startup"].items():
+            print(f"{name:<18}{r['import_ms']:>12.1f}{r['create_app_ms']:>15.1f}{r['process_ms']:>12.1f}")
+        return
+    header = f"{'scenario':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in _rows(results).items():
+        queries = "-" if r["queries_per_request"] is None else f"{r['queries_per_request']:.1f}"
+        print(f"{name:<28}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['throughput_rps']:>10.1f}{queries:>9}{r['errors']:>8}")
+
+
+def compare(results, baseline, threshold):
+    """Print per-scenario deltas; returns the names of regressed scenarios."""
+    regressions = []
+    if "startup" in results:
+        print(f"\nvs {baseline['meta'].get('commit')} (regression: process time +{threshold:.0%})")
+        for name, r in results["startup"].items():
+            old = baseline.get("startup", {}).get(name)
+            if not old:
+                continue
+            change = (r["process_ms"] - old["process_ms"]) / old["process_ms"]
+            flag = "REGRESSION" if change > threshold else ""
+            if flag:
+                regressions.append(name)
+            print(f"{name:<18}process {old['process_ms']:>8.1f} -> {r['process_ms']:>8.1f} ({change:+.0%})  {flag}")
+        return regressions
+
+    print(f"\nvs {baseline['meta'].get('commit')} (regression: p95 +{threshold:.0%} or more queries)")
+    old_rows = _rows(baseline)
+    for name, r in _rows(results).items():
+        old = old_rows.get(name)
+        if not old:
+            continue
+        p95 = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        more_queries = None not in (r["queries_per_request"], old["queries_per_request"]) and \
+            r["queries_per_request"] > old["queries_per_request"]
+        flag = "REGRESSION" if p95 > threshold or more_queries else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<28}p50 {old['p50_ms']:>8.2f} -> {r['p50_ms']:>8.2f}   p95 {old['p95_ms']:>8.2f} -> "
+              f"{r['p95_ms']:>8.2f} ({p95:+.0%})   queries {old['queries_per_request']} -> "
+              f"{r['queries_per_request']}  {flag}")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+    if "randomize" in scenarios and (args.requests + args.warmup) > args.studies * args.patients:
+        sys.exit("randomize needs at least requests + warmup seeded patients")
+
+    meta = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "database_url")},
+    }
+    if args.startup:
+        results = {"meta": meta, "startup": startup_benchmark(args.startup)}
+        return report(results, args)
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    app = load_app(database_url)
+    prepare_database(app, args.reset)
+
+    rng = random.Random(args.seed)
+    if args.search_scale or args.bulk_import or args.patient_variables:
+        return run_sweeps(app, args, rng, meta, database_url)
+    started = time.perf_counter()
+    data = seed(app, args, rng)
+    seed_seconds = time.perf_counter() - started
+    tokens = mint_tokens(app, range(1, args.users + 1))
+
+    from sqlalchemy import event
+    from models import db
+
+    queries = [0]
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    next_requests = build_scenarios(args, data, tokens, rng)
+    meta.update({
+        "database": database_url.split(":", 1)[0],
+        "server": f"gunicorn {args.server} x{args.workers}" if args.server else "test client",
+        "seed_seconds": round(seed_seconds, 2),
+        "rows": data["tables"],
+    })
+    results = {"meta": meta, "scenarios": {}}
+    with (gunicorn(args.server, args.workers, database_url) if args.server else nullcontext(app.test_client())) as client:
+        for name in scenarios:
+            result = run_scenario(client, next_requests[name], args.requests, args.warmup, queries, args.concurrency)
+            if args.server:
+                result["queries_per_request"] = None
+            results["scenarios"][name] = result
+    return report(results, args)
+
+
+def run_sweeps(app, args, rng, meta, database_url):
+    from sqlalchemy import event
+    from models import db
+
+    if args.patient_variables:
+        mount_per_object_patient(app)
+    seed_admin(app)
+    token = mint_tokens(app, [1])[1]
+    queries = [0]
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    meta.update({"database": database_url.split(":", 1)[0], "server": "test client"})
+    results = {"meta": meta, "sweeps": {}}
+    client = app.test_client()
+    if args.search_scale:
+        results["sweeps"]["search"] = search_scale(app, client, token, _sizes(args.search_scale), args, rng, queries)
+    if args.bulk_import:
+        results["sweeps"]["bulk_import"] = bulk_import(app, client, token, _sizes(args.bulk_import), args, rng, queries)
+    if args.patient_variables:
+        results["sweeps"]["create_patient"] = patient_variables(
+            app, client, token, _sizes(args.patient_variables), args, rng, queries
+        )
+    return report(results, args)
+
+
+def report(results, args):
+    print_table(results)
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    output = args.output or os.path.join(HERE, "bench-results",
+                                         f"{results['meta']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
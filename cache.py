@@ -0,0 +1,293 @@
+# cache.py
+"""Two-tier caches shared by the auth, study-config and response caches.
+
+Every named Cache has an in-process LRU/TTL tier. When CACHE_URL (or
+REDIS_URL) points at a Redis-protocol server, a shared tier sits behind it,
+so a value loaded by one gunicorn worker is warm in all of them. Deletes are
+published on a pub/sub channel as JSON, ``[cache name, [repr(key), ...]]``,
+and every worker drops the keys from its own in-process tier.
+
+Without a server, or while it is unreachable, caches keep working
+process-locally. Deletes made during an outage are kept and published once
+the server answers again; if it never does, the in-process TTLs are all that
+bound how long other workers serve the old value. Values in the shared tier
+are pickled, so only point CACHE_URL at a server the app alone can write to.
+"""
+import ast
+import json
+import os
+import pickle
+import threading
+import time
+from threading import Lock
+
+from cachetools import LRUCache, TTLCache
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+CACHE_URL = os.environ.get("CACHE_URL") or os.environ.get("REDIS_URL")
+CACHE_PREFIX = os.environ.get("CACHE_PREFIX", "ctms")
+INVALIDATION_CHANNEL = f"{CACHE_PREFIX}:invalidate"
+
+# Seconds to bypass the shared tier after an error, instead of paying a timeout per lookup. Deletes in
+# that window are replayed when the server is back; during a longer outage, other workers keep evicted
+# entries for up to their cache's local TTL (e.g. TOKEN_VERSION_TTL for revoked tokens).
+CACHE_RETRY_AFTER = int(os.environ.get("CACHE_RETRY_AFTER", 5))
+# Per cache; past this many keys the replay clears the whole cache instead
+CACHE_REPLAY_LIMIT = int(os.environ.get("CACHE_REPLAY_LIMIT", 10000))
+
+_MISSING = object()
+_caches = {}
+_client = None
+_client_pid = None
+_listener_pid = None
+_client_lock = Lock()
+_down_until = 0.0
+_unpublished = {}  # cache name -> keys deleted while the shared tier was down, or None for "all"
+
+
+class MemoryCache:
+    """In-process tier: LRU, with a TTL when one is given."""
+
+    def __init__(self, maxsize, ttl=None):
+        self._data = TTLCache(maxsize=maxsize, ttl=ttl) if ttl else LRUCache(maxsize=maxsize)
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class RedisCache:
+    """Shared tier on a Redis-protocol server. Errors degrade to cache misses."""
+
+    def __init__(self, client, name, ttl=None):
+        self.client = client
+        self.name = name
+        self.ttl = ttl
+
+    def _key(self, key):
+        return f"{CACHE_PREFIX}:{self.name}:{key!r}"
+
+    def get(self, key, default=None):
+        try:
+            raw = self.client.get(self._key(key))
+        except Exception as e:
+            _report(e)
+            return default
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self._key(key), pickle.dumps(value), ex=self.ttl or None)
+        except Exception as e:
+            _report(e)
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            self.client.delete(*[self._key(key) for key in keys])
+        except Exception as e:
+            _report(e)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=f"{CACHE_PREFIX}:{self.name}:*"):
+            self.client.delete(key)
+
+
+class Cache:
+    """A named cache: in-process tier in front of the optional shared tier."""
+
+    def __init__(self, name, maxsize, ttl=None):
+        self.name = name
+        self.ttl = ttl
+        self.local = MemoryCache(maxsize, ttl)
+        _caches[name] = self
+
+    @property
+    def shared(self):
+        client = get_client()
+        return RedisCache(client, self.name, self.ttl) if client is not None else None
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        shared = self.shared
+        if shared is None:
+            return default
+        value = shared.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        shared = self.shared
+        if shared is not None:
+            shared.set(key, value)
+
+    def delete(self, *keys):
+        """Evict ``keys`` here, in the shared tier and in every other worker."""
+        self.local.delete(*keys)
+        if keys:
+            _publish(self.name, keys)
+
+    def delete_on_commit(self, session, *keys):
+        """Delete ``keys`` once ``session`` commits, so no worker can re-cache
+        the old value from a transaction that has not committed yet."""
+        pending = session.info.setdefault("cache_invalidations", {})
+        pending.setdefault(self.name, set()).update(keys)
+
+    def __len__(self):
+        return len(self.local)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for name, keys in session.info.pop("cache_invalidations", {}).items():
+        _caches[name].delete(*keys)
+
+
+def _report(error):
+    global _down_until
+    if time.monotonic() >= _down_until:
+        print("⚠️ Shared cache unavailable, using in-process caches only:", error)
+    _down_until = time.monotonic() + CACHE_RETRY_AFTER
+
+
+def _publish(name, keys):
+    """Delete ``keys`` of cache ``name`` from the shared tier and tell every worker; ``keys`` None means all."""
+    client = get_client()
+    if client is None:
+        if _client is not None:  # configured but down
+            _remember(name, keys)
+        return
+    shared = RedisCache(client, name)
+    try:
+        if keys is None:
+            shared.clear()
+        else:
+            client.delete(*[shared._key(key) for key in keys])
+        message = [name, None if keys is None else [repr(key) for key in keys]]
+        client.publish(INVALIDATION_CHANNEL, json.dumps(message))
+    except Exception as e:
+        _report(e)
+        _remember(name, keys)
+
+
+def _remember(name, keys):
+    with _client_lock:
+        pending = _unpublished.get(name, set())
+        if pending is None or keys is None or len(pending) + len(keys) > CACHE_REPLAY_LIMIT:
+            _unpublished[name] = None
+        else:
+            _unpublished[name] = pending | set(keys)
+
+
+def _replay():
+    with _client_lock:
+        pending = dict(_unpublished)
+        _unpublished.clear()
+    for name, keys in pending.items():
+        _publish(name, keys)
+
+
+def _apply(data):
+    """Evict what another worker published. Anything but a well-formed message is ignored."""
+    try:
+        name, keys = json.loads(data)
+        cache = _caches.get(name)
+        keys = None if keys is None else [ast.literal_eval(key) for key in keys]
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        print("⚠️ Ignoring malformed cache invalidation:", data[:200])
+        return
+    if cache is None:
+        return
+    if keys is None:
+        cache.local.clear()
+    else:
+        cache.local.delete(*keys)
+
+
+def use_client(client):
+    """Point the shared tier at ``client`` (a redis.Redis, fakeredis, or None)."""
+    global _client, _client_pid, _listener_pid, _down_until
+    with _client_lock:
+        _client, _client_pid, _listener_pid, _down_until = client, os.getpid(), None, 0.0
+        _unpublished.clear()
+
+
+def get_client():
+    global _client, _client_pid
+    if _client_pid != os.getpid():
+        with _client_lock:
+            if _client_pid != os.getpid():
+                _client = None
+                if CACHE_URL:
+                    import redis
+                    _client = redis.Redis.from_url(CACHE_URL, socket_timeout=1, socket_connect_timeout=1)
+                _client_pid = os.getpid()
+    if _client is None or time.monotonic() < _down_until:
+        return None
+    if _listener_pid != os.getpid():
+        _start_listener()
+    if _unpublished:
+        _replay()
+    return _client
+
+
+def _start_listener():
+    global _listener_pid
+    with _client_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        client = _client
+    threading.Thread(target=_listen, args=(client,), name="cache-invalidation", daemon=True).start()
+
+
+def _listen(client):
+    # Runs until use_client() swaps the client out
+    while client is _client:
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Deletes published while we were not listening are lost: start clean
+            for cache in _caches.values():
+                cache.local.clear()
+            while client is _client:
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    _apply(message["data"])
+            pubsub.close()
+        except Exception as e:
+            _report(e)
+            time.sleep(1)
+
+
+def cache_stats():
+    return {
+        "backend": "redis" if CACHE_URL or _client is not None else "memory",
+        "healthy": time.monotonic() >= _down_until,
+        "caches": {name: {"size": len(cache), "ttl": cache.ttl} for name, cache in _caches.items()},
+    }
@@ -0,0 +1,267 @@
+# commands.py
+import csv
+import json
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from types import SimpleNamespace
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select, create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.orm import Session, undefer
+from models import db, Study, TreatmentArm, AllocationSequence, AllocationSlot, Users
+from randomization_engine import pregenerate, block_sizes, parse_factors, all_strata
+
+randomization_cli = AppGroup("randomization", help="Allocation list export and schedule simulation.")
+perf_cli = AppGroup("perf", help="Performance microbenchmarks.")
+
+
+def _load_study(study_id):
+    study = Study.query.get(study_id)
+    if not study:
+        raise click.UsageError(f"Study {study_id} not found")
+    arms = TreatmentArm.query.filter_by(study_id=study_id).order_by(TreatmentArm.id).all()
+    if not arms:
+        raise click.UsageError("No treatment arms defined")
+    return study, arms
+
+
+@randomization_cli.command("export-list")
+@click.argument("study_id", type=int)
+@click.option("--per-stratum", default=100, show_default=True, help="Slots to have generated in every stratum.")
+@click.option("--output", type=click.File("w"), default="-", help="CSV file (default: stdout).")
+def export_list(study_id, per_stratum, output):
+    """Pre-generate a study's allocation lists and write them as CSV.
+
+    Block and stratified lists are persisted, so the export is exactly what
+    /api/randomize will hand out. Simple randomization keeps no list; a fresh
+    illustrative one is written instead.
+    """
+    study, arms = _load_study(study_id)
+    writer = csv.writer(output)
+    writer.writerow(["stratum", "position", "block_number", "block_size", "treatment_arm_id", "treatment_arm"])
+    names = {arm.id: arm.name for arm in arms}
+
+    if study.randomization_type == "simple":
+        rng = random.SystemRandom()
+        weights = [arm.allocation_ratio or 1 for arm in arms]
+        for position in range(per_stratum):
+            arm = rng.choices(arms, weights=weights)[0]
+            writer.writerow(["", position, "", "", arm.id, arm.name])
+        return
+
+    if study.randomization_type == "block":
+        strata = [""]
+    elif study.randomization_type == "stratified":
+        strata = all_strata(parse_factors(study.stratification_factors))
+        if strata is None:
+            raise click.UsageError("Every stratification factor needs declared levels")
+    else:
+        raise click.UsageError(f"No allocation list for randomization type: {study.randomization_type}")
+
+    for stratum in strata:
+        pregenerate(study, arms, stratum, per_stratum)
+    db.session.commit()
+
+    slots = db.session.execute(
+        select(AllocationSequence.stratum_key, AllocationSlot.position, AllocationSlot.block_number,
+               AllocationSlot.block_size, AllocationSlot.treatment_arm_id)
+        .join(AllocationSequence, AllocationSequence.id == AllocationSlot.sequence_id)
+        .where(AllocationSequence.study_id == study_id)
+        .order_by(AllocationSequence.stratum_key, AllocationSlot.position)
+        .execution_options(yield_per=5000)
+    )
+    for stratum, position, block_number, size, arm_id in slots:
+        writer.writerow([stratum, position, block_number, size, arm_id, names.get(arm_id)])
+
+
+@randomization_cli.command("simulate")
+@click.argument("study_id", type=int)
+@click.option("--trials", default=10000, show_default=True)
+@click.option("--patients", default=200, show_default=True, help="Patients per simulated trial.")
+@click.option("--seed", type=int, default=None)
+def simulate_schedule(study_id, trials, patients, seed):
+    """Monte Carlo imbalance and predictability of a study's allocation schedule."""
+    from randomization_sim import simulate, STRATEGIES
+
+    study, arms = _load_study(study_id)
+    if study.randomization_type not in STRATEGIES:
+        raise click.UsageError(f"Cannot simulate randomization type: {study.randomization_type}")
+    factors = parse_factors(study.stratification_factors)
+    if study.randomization_type == "minimization" and not factors:
+        raise click.UsageError("Minimization needs at least one stratification factor")
+    if study.randomization_type in ("stratified", "minimization") and any(levels is None for _, levels in factors):
+        raise click.UsageError("Every stratification factor needs declared levels")
+
+    result = simulate(
+        study.randomization_type,
+        [max(arm.allocation_ratio or 1, 1) for arm in arms],
+        block_sizes=block_sizes(arms, study.block_size),
+        n_patients=patients,
+        trials=trials,
+        n_strata=len(all_strata(factors) or [""]),
+        factor_levels=[len(levels) for _, levels in factors],
+        seed=seed,
+    )
+    click.echo(json.dumps(result, indent=2))
+
+
+# --- perf ---
+
+def _fake_studies(count):
+    now = datetime.utcnow()
+    sites = [SimpleNamespace(id=i, name=f"Site {i}", location="Hanoi") for i in range(5)]
+    users = [
+        SimpleNamespace(id=i, username=f"user{i}", first_name="First", last_name="Last", title="Dr", role="investigator")
+        for i in range(4)
+    ]
+    return [
+        SimpleNamespace(
+            id=i, name=f"Study {i}", protocol_number=f"PRT-{i}", irb_number=f"IRB-{i}",
+            start_date=date(2024, 1, 1), end_date=date(2026, 1, 1) + timedelta(days=i % 365),
+            created_by=1, updated_by=1, is_randomized=True, randomization_type="block", block_size=4,
+            stratification_factors=None, timestamp_created=now, timestamp_updated=now,
+            study_sites=[SimpleNamespace(site=site) for site in sites], users=users,
+        )
+        for i in range(count)
+    ]
+
+
+def _hand_written(studies):
+    return [
+        {
+            "id": s.id,
+            "name": s.name,
+            "protocol_number": s.protocol_number,
+            "irb_number": s.irb_number,
+            "start_date": s.start_date.isoformat() if s.start_date else None,
+            "end_date": s.end_date.isoformat() if s.end_date else None,
+            "created_by": s.created_by,
+            "updated_by": s.updated_by,
+            "is_randomized": s.is_randomized,
+            "randomization_type": s.randomization_type,
+            "block_size": s.block_size,
+            "stratification_factors": s.stratification_factors,
+            "sites": [{"id": ss.site.id, "name": ss.site.name, "location": ss.site.location} for ss in s.study_sites],
+            "users": [
+                {"id": u.id, "username": u.username, "first_name": u.first_name, "last_name": u.last_name,
+                 "title": u.title, "role": u.role}
+                for u in s.users
+            ],
+        }
+        for s in studies
+    ]
+
+
+def _best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+@perf_cli.command("json")
+@click.option("--rows", default=2000, show_default=True, help="Studies (5 sites, 4 users each) per response.")
+@click.option("--repeat", default=5, show_default=True)
+def json_benchmark(rows, repeat):
+    """Compare hand-built dicts + stdlib JSON with serializers + the app's JSON provider."""
+    from serializers import STUDY
+
+    studies = _fake_studies(rows)
+    stdlib = DefaultJSONProvider(current_app._get_current_object())
+    assert json.loads(stdlib.dumps(_hand_written(studies))) == json.loads(current_app.json.dumps(STUDY.many(studies)))
+
+    legacy = _best_of(lambda: stdlib.response(_hand_written(studies)), repeat)
+    current = _best_of(lambda: current_app.json.response(STUDY.many(studies)), repeat)
+    click.echo(json.dumps({
+        "rows": rows,
+        "provider": type(current_app.json).__name__,
+        "hand_written_stdlib_ms": round(legacy * 1000, 2),
+        "serializer_provider_ms": round(current * 1000, 2),
+        "speedup": round(legacy / current, 2) if current else None,
+    }, indent=2))
+
+
+def _measure(fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": round(elapsed * 1000, 1), "peak_mib": round(peak / 2**20, 1)}
+
+
+@perf_cli.command("projection")
+@click.option("--rows", default=100000, show_default=True)
+def projection_benchmark(rows):
+    """Full ORM hydration vs column projection for the users list, on a scratch in-memory DB."""
+    from serializers import USER
+
+    engine = create_engine("sqlite://")
+    Users.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(Users.__table__.insert(), [
+            {"username": f"user{i}", "password": "scrypt:32768:8:1$" + "x" * 150, "role": "investigator",
+             "first_name": "First", "last_name": "Last", "title": "Dr"}
+            for i in range(rows)
+        ])
+
+    def hydrated():
+        with Session(engine) as session:
+            return USER.many(session.query(Users).options(undefer(Users.password)).all())
+
+    def projected():
+        with Session(engine) as session:
+            return USER.many(session.query(*USER.columns(Users)).all())
+
+    assert hydrated() == projected()
+    click.echo(json.dumps({"rows": rows, "orm_objects": _measure(hydrated), "projected_rows": _measure(projected)}, indent=2))
+
+
+@perf_cli.command("pool")
+@click.option("--threads", default=40, show_default=True, help="Concurrent clients; above pool size + overflow saturates the pool.")
+@click.option("--seconds", default=5.0, show_default=True)
+@click.option("--hold-ms", default=50, show_default=True, help="How long each client keeps its connection.")
+def pool_load_test(threads, seconds, hold_ms):
+    """Hammer the configured engine's pool and report throughput, waits and timeouts."""
+    from db_pool import pool_stats
+
+    engine = db.engine
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        done = timeouts = 0
+        while time.perf_counter() < deadline:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                    time.sleep(hold_ms / 1000)
+                done += 1
+            except PoolTimeout:
+                timeouts += 1
+        return done, timeouts
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda _: client(), range(threads)))
+    elapsed = time.perf_counter() - started
+
+    done = sum(d for d, _ in results)
+    click.echo(json.dumps({
+        "threads": threads,
+        "hold_ms": hold_ms,
+        "queries": done,
+        "client_timeouts": sum(t for _, t in results),
+        "queries_per_second": round(done / elapsed, 1),
+        "pool": pool_stats(),
+    }, indent=2))
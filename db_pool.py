@@ -0,0 +1,123 @@
+# db_pool.py
+"""Environment-driven SQLAlchemy engine options and pool health metrics.
+
+Sizing is per process. With gunicorn, the server-side connection count is
+workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW), and that must stay under the
+database's connection limit. Pre-ping and recycle drop connections the
+server or a proxy closed behind our back, and DB_STATEMENT_TIMEOUT_MS stops
+a runaway query from pinning a connection forever (PostgreSQL only).
+
+InstrumentedQueuePool times every checkout, so pool_stats() can report how
+long requests queue for a connection, how many gave up, and how many
+connections are in use right now. pool_stats() reads ``engine.pool`` on every
+call, because engine.dispose() swaps in a new pool, e.g. in each gunicorn
+worker after a preloaded fork.
+"""
+import os
+import time
+from collections import deque
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+PERCENTILES = (50, 95, 99)
+
+_lock = Lock()
+_waits = deque(maxlen=10000)  # recent checkout waits, seconds
+_stats = {"checkouts": 0, "timeouts": 0, "connects": 0, "invalidated": 0, "wait_total": 0.0, "wait_max": 0.0}
+_engines = []
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+class InstrumentedQueuePool(QueuePool):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeout:
+            with _lock:
+                _stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with _lock:
+                _stats["checkouts"] += 1
+                _stats["wait_total"] += waited
+                _stats["wait_max"] = max(_stats["wait_max"], waited)
+                _waits.append(waited)
+
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``database_uri``, read from the environment."""
+    options = {
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    }
+    if database_uri.startswith("sqlite") and (":memory:" in database_uri or database_uri.rstrip("/") == "sqlite:"):
+        return options  # in-memory SQLite lives in one connection; pool sizing does not apply
+
+    options.update({
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),  # whole seconds
+        "pool_use_lifo": True,  # idle connections beyond the hot set age out via recycle
+    })
+    statement_timeout = os.environ.get("DB_STATEMENT_TIMEOUT_MS")
+    if statement_timeout and database_uri.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={int(statement_timeout)}"}
+    return options
+
+
+def instrument(engine):
+    """Count connects and invalidations on ``engine`` and make its pool visible to pool_stats()."""
+    if engine in _engines:
+        return
+    _engines.append(engine)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        with _lock:
+            _stats["connects"] += 1
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        with _lock:
+            _stats["invalidated"] += 1
+
+
+def _percentile(ordered, p):
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)] if ordered else 0.0
+
+
+def pool_stats():
+    with _lock:
+        stats = dict(_stats)
+        ordered = sorted(_waits)
+    checkouts, wait_total, wait_max = stats.pop("checkouts"), stats.pop("wait_total"), stats.pop("wait_max")
+    result = {
+        "checkouts": checkouts,
+        **stats,
+        "wait_max_ms": round(wait_max * 1000, 2),
+        "wait_avg_ms": round(wait_total / checkouts * 1000, 2) if checkouts else 0.0,
+        **{f"wait_p{p}_ms": round(_percentile(ordered, p) * 1000, 2) for p in PERCENTILES},
+        "pools": [],
+    }
+    for pool in (engine.pool for engine in _engines):
+        entry = {"class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        result["pools"].append(entry)
+    return result
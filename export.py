@@ -0,0 +1,159 @@
+# export.py
+"""Streaming study data export.
+
+Patients and their EAV PatientVariable rows are read in one ordered query
+through a server-side cursor (``yield_per``) and pivoted on the fly into one
+row per patient with one column per StudyVariable, so memory stays flat no
+matter how many patients a study has.
+"""
+import csv
+import io
+import json
+from itertools import groupby
+
+from sqlalchemy import select
+from models import db, Patient, PatientVariable, StudyVariable
+
+EXPORT_BATCH_SIZE = 1000
+
+PATIENT_COLUMNS = (
+    "id", "site_id", "name", "dob", "sex", "para", "phone", "email", "ethnicity",
+    "pregnancy_status", "notes", "consent_date", "enrollment_status", "is_active",
+    "timestamp_created", "timestamp_updated"
+)
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def variable_columns(study_id):
+    """``[(variable_id, column name)]`` in definition order; names are made unique."""
+    columns, seen = [], set(PATIENT_COLUMNS)
+    for variable_id, name in (
+        db.session.query(StudyVariable.id, StudyVariable.name)
+        .filter(StudyVariable.study_id == study_id)
+        .order_by(StudyVariable.id)
+    ):
+        column = name if name not in seen else f"{name}_{variable_id}"
+        seen.add(column)
+        columns.append((variable_id, column))
+    return columns
+
+
+def iter_patient_rows(study_id, variables):
+    """Yield one flat tuple per patient: patient columns, then variable values."""
+    positions = {variable_id: i for i, (variable_id, _) in enumerate(variables)}
+    stmt = (
+        select(*[getattr(Patient, c) for c in PATIENT_COLUMNS], PatientVariable.variable_id, PatientVariable.value)
+        .outerjoin(PatientVariable, PatientVariable.patient_id == Patient.id)
+        .where(Patient.study_id == study_id)
+        .order_by(Patient.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    width = len(PATIENT_COLUMNS)
+    result = db.session.execute(stmt)
+    try:
+        for _, rows in groupby(result, key=lambda r: r[0]):
+            values = [None] * len(variables)
+            for row in rows:
+                if row[width] in positions:
+                    values[positions[row[width]]] = row[width + 1]
+            yield tuple(row[:width]) + tuple(values)
+    finally:
+        result.close()
+
+
+def _batched(rows, size=EXPORT_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for batch in _batched(rows):
+        yield "".join(writer.writerow(row) for row in batch)
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def stream_ndjson(header, rows):
+    for batch in _batched(rows):
+        yield "".join(
+            json.dumps(dict(zip(header, row)), default=_json_default, ensure_ascii=False) + "\n"
+            for row in batch
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_parquet(header, rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    patient_types = {
+        "id": pa.int64(), "site_id": pa.int64(), "dob": pa.date32(), "consent_date": pa.date32(),
+        "is_active": pa.bool_(), "timestamp_created": pa.timestamp("us"), "timestamp_updated": pa.timestamp("us"),
+    }
+    schema = pa.schema([(name, patient_types.get(name, pa.string())) for name in header])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        # Each batch becomes a row group, flushed to the client as soon as it is written
+        for batch in _batched(rows):
+            writer.write_batch(pa.RecordBatch.from_pylist([dict(zip(header, row)) for row in batch], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_study(study_id, fmt):
+    """Return a generator of response chunks for ``fmt``."""
+    variables = variable_columns(study_id)
+    header = list(PATIENT_COLUMNS) + [name for _, name in variables]
+    rows = iter_patient_rows(study_id, variables)
+    if fmt == "csv":
+        return stream_csv(header, rows)
+    if fmt == "ndjson":
+        return stream_ndjson(header, rows)
+    return stream_parquet(header, rows)
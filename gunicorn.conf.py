@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+"""Gunicorn settings, chosen through the environment.
+
+WORKER_CLASS selects the concurrency model:
+- ``sync`` (default): one request per worker process. Simple, but every
+  request holds its worker through all of its database round trips.
+- ``gthread``: GUNICORN_THREADS requests per worker, on OS threads.
+- ``gevent``: up to WORKER_CONNECTIONS requests per worker, on greenlets.
+  The standard library is monkey-patched, and psycopg2 is made cooperative
+  with psycogreen. A request waiting on PostgreSQL yields to the others
+  instead of blocking its worker. Best for the read-heavy, I/O-bound
+  endpoints.
+
+With gthread or gevent, many requests share one worker's connection pool.
+Raise DB_POOL_SIZE / DB_MAX_OVERFLOW to match (see db_pool.py), within the
+database's connection limit.
+
+GUNICORN_PRELOAD=1 (or ``--preload``) builds the app once in the master, so
+workers fork with it already imported. This gives faster, copy-on-write
+worker boots. Every worker then disposes the engine pool it inherited, so no
+two processes share a database socket. Do not combine it with gevent: the
+app would be imported before the worker monkey-patches the standard library.
+
+    gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+worker_class = os.environ.get("WORKER_CLASS", "sync")
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8)) if worker_class == "gthread" else 1
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "").lower() in ("1", "true", "yes", "on")
+
+# Workers never run migrations, so create_app() can skip importing Flask-Migrate and alembic
+os.environ.setdefault("APP_MIGRATE", "0")
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from models import db
+        with worker.app.wsgi().app_context():
+            # close=False: leave the master's connections open for the master, just forget them here
+            db.engine.dispose(close=False)
+    if server.cfg.worker_class_str != "gevent":
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:  # psycopg2 not installed, e.g. SQLite in development
+        server.log.warning("psycogreen/psycopg2 not available; database calls will block the gevent loop")
+        return
+    patch_psycopg()
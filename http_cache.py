@@ -0,0 +1,73 @@
+# http_cache.py
+"""Conditional GET for read endpoints the SPA polls.
+
+A view decorated with ``@conditional(validator)`` first runs ``validator``,
+which returns a cheap version of the data behind the response, e.g. the
+row count and max(timestamp_updated) of a table or a study's
+``config_version``. The ETag is a hash of that version, the request URL and
+the caller's identity and role, since the same URL yields different bodies
+for different users. A matching ``If-None-Match`` gets a 304 without running
+the view's query or encoding any JSON.
+
+Response bodies are also kept in a shared cache under their ETag. A client
+without a matching ETag, e.g. another browser or a fresh tab, is then served
+the stored body as long as the data has not changed.
+"""
+import hashlib
+import os
+from datetime import datetime
+from functools import wraps
+
+from flask import request, make_response
+from flask_jwt_extended import get_jwt_identity
+from auth import get_current_user
+from cache import Cache
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 256))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+
+# Keyed by ETag, which changes with the data, so entries never need evicting
+_responses = Cache("responses", maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+
+def _etag(version):
+    user = get_current_user()
+    raw = repr((request.full_path, get_jwt_identity(), user.role if user else None, version))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional(validator):
+    """``validator(**view_args)`` returns ``(version, last_modified)``; a
+    version of None (e.g. unknown study) skips caching and runs the view."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+
+            version, last_modified = validator(**kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            etag = _etag(version)
+            # Only the ETag is trusted: a delete does not move max(timestamp_updated)
+            if etag in request.if_none_match:
+                response = make_response("", 304)
+            elif (cached := _responses.get(etag)) is not None:
+                body, content_type = cached
+                response = make_response(body, 200, {"Content-Type": content_type})
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                _responses.set(etag, (response.get_data(), response.content_type))
+
+            response.set_etag(etag)
+            if isinstance(last_modified, datetime):
+                response.last_modified = last_modified
+            # Browsers must revalidate every time, and shared caches must not store per-user bodies
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
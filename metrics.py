@@ -0,0 +1,216 @@
+# metrics.py
+"""Per-endpoint request metrics, SQL instrumentation and opt-in profiling.
+
+For every request this records:
+- latency, into a histogram;
+- the number of SQL statements and the time spent in them, counted with
+  SQLAlchemy before/after_cursor_execute events;
+- the response size.
+
+All of it is served in Prometheus text format on /metrics. Set METRICS_TOKEN
+to require ``Authorization: Bearer <token>`` there. Counters live in each
+worker process, so behind a single port a scrape sees whichever worker
+answered it.
+
+A request is logged as slow when it crosses SLOW_REQUEST_MS. It is logged as
+a likely N+1 when one statement repeats N_PLUS_ONE_THRESHOLD times in a
+single request. Send ``X-Profile: <PROFILE_TOKEN>`` to run a single request
+under cProfile; its stats are written to PROFILE_DIR and their file name is
+returned in ``X-Profile-File``.
+"""
+import cProfile
+import os
+import pstats
+import time
+import uuid
+from collections import Counter, defaultdict
+from threading import Lock
+
+from flask import Response, current_app, g, has_request_context, request, got_request_exception
+from sqlalchemy import event
+from db_pool import pool_stats
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/profiles")
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 20))
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = Lock()
+_requests = Counter()  # (method, endpoint, status) -> count
+_exceptions = Counter()  # (method, endpoint) -> count
+_latency = defaultdict(lambda: [0] * (len(BUCKETS) + 1))  # cumulative buckets, +Inf last
+_latency_sum = Counter()
+_sql_statements = Counter()
+_sql_seconds = Counter()
+_response_bytes = Counter()
+
+
+def _endpoint():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+# --- SQL ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    if has_request_context() and "sql_count" in g:
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+        g.sql_statements[statement] += 1
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+# --- Request hooks ---
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.sql_count, g.sql_seconds, g.sql_statements = 0, 0.0, Counter()
+    if PROFILE_TOKEN and request.headers.get("X-Profile") == PROFILE_TOKEN:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _after_request(response):
+    if "request_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    key = (request.method, _endpoint())
+    size = response.calculate_content_length() or 0  # streamed bodies are not counted
+
+    with _lock:
+        _requests[key + (response.status_code,)] += 1
+        buckets = _latency[key]
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                buckets[i] += 1
+        buckets[-1] += 1
+        _latency_sum[key] += elapsed
+        _sql_statements[key] += g.sql_count
+        _sql_seconds[key] += g.sql_seconds
+        _response_bytes[key] += size
+
+    _log_slow(key, elapsed)
+
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{int(time.time())}-{uuid.uuid4().hex[:8]}.prof")
+        pstats.Stats(profiler).dump_stats(path)
+        response.headers["X-Profile-File"] = os.path.basename(path)
+    return response
+
+
+def _log_slow(key, elapsed):
+    statement, repeats = g.sql_statements.most_common(1)[0] if g.sql_statements else (None, 0)
+    if repeats >= N_PLUS_ONE_THRESHOLD:
+        current_app.logger.warning(
+            "Possible N+1 on %s %s: %d statements (%.1f ms in SQL), repeated %dx: %s",
+            *key, g.sql_count, g.sql_seconds * 1000, repeats, " ".join(statement.split())[:200]
+        )
+    elif elapsed * 1000 >= SLOW_REQUEST_MS:
+        current_app.logger.warning(
+            "Slow request %s %s: %.1f ms, %d statements (%.1f ms in SQL)",
+            *key, elapsed * 1000, g.sql_count, g.sql_seconds * 1000
+        )
+
+
+def _on_exception(sender, exception, **extra):
+    sender.logger.error("Unhandled exception on %s %s", request.method, _endpoint(), exc_info=exception)
+    with _lock:
+        _exceptions[(request.method, _endpoint())] += 1
+
+
+# --- Exposition ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(method, endpoint, **extra):
+    pairs = {"method": method, "endpoint": endpoint, **extra}
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+
+def render():
+    """Current metrics in Prometheus text exposition format."""
+    with _lock:
+        requests, exceptions = dict(_requests), dict(_exceptions)
+        latency = {key: list(buckets) for key, buckets in _latency.items()}
+        latency_sum, statements = dict(_latency_sum), dict(_sql_statements)
+        sql_seconds, response_bytes = dict(_sql_seconds), dict(_response_bytes)
+
+    lines = [
+        "# HELP http_requests_total Requests by endpoint and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    lines += [f"http_requests_total{{{_labels(m, e, status=s)}}} {n}" for (m, e, s), n in sorted(requests.items())]
+
+    lines += [
+        "# HELP http_request_exceptions_total Unhandled exceptions by endpoint.",
+        "# TYPE http_request_exceptions_total counter",
+    ]
+    lines += [f"http_request_exceptions_total{{{_labels(m, e)}}} {n}" for (m, e), n in sorted(exceptions.items())]
+
+    lines += [
+        "# HELP http_request_duration_seconds Request latency.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (m, e), buckets in sorted(latency.items()):
+        for bound, count in zip(BUCKETS, buckets):
+            lines.append(f"http_request_duration_seconds_bucket{{{_labels(m, e, le=bound)}}} {count}")
+        lines.append(f'http_request_duration_seconds_bucket{{{_labels(m, e, le="+Inf")}}} {buckets[-1]}')
+        lines.append(f"http_request_duration_seconds_sum{{{_labels(m, e)}}} {latency_sum[(m, e)]:.6f}")
+        lines.append(f"http_request_duration_seconds_count{{{_labels(m, e)}}} {buckets[-1]}")
+
+    for name, help_text, values, fmt in (
+        ("http_request_sql_statements_total", "SQL statements executed.", statements, "{}"),
+        ("http_request_sql_seconds_total", "Time spent in SQL.", sql_seconds, "{:.6f}"),
+        ("http_response_bytes_total", "Response body bytes (streamed bodies excluded).", response_bytes, "{}"),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        lines += [f"{name}{{{_labels(m, e)}}} {fmt.format(v)}" for (m, e), v in sorted(values.items())]
+
+    pool = pool_stats()
+    lines += [
+        "# HELP db_pool_checkout_timeouts_total Pool checkouts that timed out.",
+        "# TYPE db_pool_checkout_timeouts_total counter",
+        f"db_pool_checkout_timeouts_total {pool['timeouts']}",
+        "# HELP db_pool_checkout_wait_p95_seconds 95th percentile of recent pool checkout waits.",
+        "# TYPE db_pool_checkout_wait_p95_seconds gauge",
+        f"db_pool_checkout_wait_p95_seconds {pool['wait_p95_ms'] / 1000:.6f}",
+    ]
+    for name in ("in_use", "idle", "overflow"):
+        lines += [f"# TYPE db_pool_{name} gauge"]
+        lines += [f"db_pool_{name} {p[name]}" for p in pool["pools"] if name in p]
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app, engine):
+    """Install request hooks on ``app``, SQL timing on ``engine`` and the /metrics route."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    got_request_exception.connect(_on_exception, app)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
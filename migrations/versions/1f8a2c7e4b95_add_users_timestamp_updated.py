@@ -0,0 +1,29 @@
+"""add users.timestamp_updated
+
+Revision ID: 1f8a2c7e4b95
+Revises: e4b7d19c6a53
+Create Date: 2026-10-16 17:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f8a2c7e4b95'
+down_revision = 'e4b7d19c6a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'timestamp_updated' in columns:
+        return
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('timestamp_updated', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('timestamp_updated')
@@ -0,0 +1,169 @@
+"""baseline schema
+
+Revision ID: 5b1e0c2d9a41
+Revises:
+Create Date: 2026-10-16 09:00:00.000000
+
+Schema as it was created by db.create_all() before migrations existed.
+Skipped on databases that already have it, so existing deployments can run
+`flask db upgrade` without stamping first.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e0c2d9a41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'users' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('first_name', sa.String(length=100), nullable=True),
+        sa.Column('last_name', sa.String(length=100), nullable=True),
+        sa.Column('title', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table('site',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=500), nullable=False),
+        sa.Column('location', sa.Text(), nullable=True),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.Column('timestamp_updated', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('patient',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('study_id', sa.Integer(), nullable=True),
+        sa.Column('site_id', sa.Integer(), nullable=True),
+        sa.Column('para', sa.String(length=4), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('dob', sa.Date(), nullable=False),
+        sa.Column('sex', sa.String(length=10), nullable=False),
+        sa.Column('phone', sa.String(length=50), nullable=True),
+        sa.Column('email', sa.String(length=255), nullable=True),
+        sa.Column('ethnicity', sa.String(length=50), nullable=True),
+        sa.Column('pregnancy_status', sa.String(length=50), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('consent_date', sa.Date(), nullable=True),
+        sa.Column('enrollment_status', sa.String(length=50), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('entered_by', sa.Integer(), nullable=True),
+        sa.Column('updated_by', sa.Integer(), nullable=True),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.Column('timestamp_updated', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['entered_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['updated_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('study',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('protocol_number', sa.String(length=100), nullable=True),
+        sa.Column('irb_number', sa.String(length=100), nullable=True),
+        sa.Column('start_date', sa.Date(), nullable=True),
+        sa.Column('end_date', sa.Date(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('updated_by', sa.Integer(), nullable=True),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.Column('timestamp_updated', sa.DateTime(), nullable=True),
+        sa.Column('is_randomized', sa.Boolean(), nullable=True),
+        sa.Column('randomization_type', sa.String(length=50), nullable=True),
+        sa.Column('block_size', sa.Integer(), nullable=True),
+        sa.Column('stratification_factors', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['updated_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('study_site',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('study_id', sa.Integer(), nullable=False),
+        sa.Column('site_id', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.Column('timestamp_updated', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['site_id'], ['site.id']),
+        sa.ForeignKeyConstraint(['study_id'], ['study.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('study_users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('study_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['study_id'], ['study.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('treatment_arm',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('study_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('allocation_ratio', sa.Integer(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['study_id'], ['study.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('study_variable',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('study_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('variable_type', sa.String(), nullable=False),
+        sa.Column('required', sa.Boolean(), nullable=True),
+        sa.Column('options', sa.Text(), nullable=True),
+        sa.Column('entry_stage', sa.String(length=50), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('updated_by', sa.Integer(), nullable=True),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.Column('timestamp_updated', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['study_id'], ['study.id']),
+        sa.ForeignKeyConstraint(['updated_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('patient_variable',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.Column('variable_id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Text(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('updated_by', sa.Integer(), nullable=True),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.Column('timestamp_updated', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['patient_id'], ['patient.id']),
+        sa.ForeignKeyConstraint(['updated_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['variable_id'], ['study_variable.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('patient_id', 'variable_id', name='uix_patient_variable')
+    )
+
+
+def downgrade():
+    op.drop_table('patient_variable')
+    op.drop_table('study_variable')
+    op.drop_table('treatment_arm')
+    op.drop_table('study_users')
+    op.drop_table('study_site')
+    op.drop_table('study')
+    op.drop_table('patient')
+    op.drop_table('site')
+    op.drop_table('users')
@@ -0,0 +1,29 @@
+"""add study.members_version
+
+Revision ID: 6d2e8b4f1a70
+Revises: 1f8a2c7e4b95
+Create Date: 2026-10-16 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d2e8b4f1a70'
+down_revision = '1f8a2c7e4b95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('study')}
+    if 'members_version' in columns:
+        return
+    with op.batch_alter_table('study') as batch_op:
+        batch_op.add_column(sa.Column('members_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('study') as batch_op:
+        batch_op.drop_column('members_version')
@@ -0,0 +1,29 @@
+"""add users.token_version
+
+Revision ID: 8c4f7a1e2b90
+Revises: 5b1e0c2d9a41
+Create Date: 2026-10-16 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4f7a1e2b90'
+down_revision = '5b1e0c2d9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'token_version' in columns:
+        return
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_version')
@@ -0,0 +1,30 @@
+"""add table_version
+
+Revision ID: 9e4a1c6b3d27
+Revises: 6d2e8b4f1a70
+Create Date: 2026-10-16 23:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4a1c6b3d27'
+down_revision = '6d2e8b4f1a70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('table_version'):
+        return
+    op.create_table('table_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_version')
@@ -0,0 +1,79 @@
+"""randomization and permuted-block allocation lists
+
+Revision ID: a3c58e9d1f64
+Revises: f7e31a5c8d02
+Create Date: 2026-10-16 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c58e9d1f64'
+down_revision = 'f7e31a5c8d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'randomization' not in tables:
+        op.create_table('randomization',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('study_id', sa.Integer(), nullable=False),
+            sa.Column('patient_id', sa.Integer(), nullable=False),
+            sa.Column('site_id', sa.Integer(), nullable=True),
+            sa.Column('treatment_arm', sa.String(length=100), nullable=False),
+            sa.Column('treatment_arm_id', sa.Integer(), nullable=True),
+            sa.Column('stratum_key', sa.String(length=255), nullable=True),
+            sa.Column('allocation_position', sa.Integer(), nullable=True),
+            sa.Column('stratification_factors', sa.Text(), nullable=True),
+            sa.Column('randomization_date', sa.DateTime(), nullable=True),
+            sa.Column('entered_by', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['entered_by'], ['users.id']),
+            sa.ForeignKeyConstraint(['patient_id'], ['patient.id']),
+            sa.ForeignKeyConstraint(['study_id'], ['study.id']),
+            sa.ForeignKeyConstraint(['treatment_arm_id'], ['treatment_arm.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('patient_id')
+        )
+        op.create_index('ix_randomization_study_id', 'randomization', ['study_id'])
+        op.create_index('ix_randomization_site_id', 'randomization', ['site_id'])
+
+    if 'allocation_sequence' not in tables:
+        op.create_table('allocation_sequence',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('study_id', sa.Integer(), nullable=False),
+            sa.Column('stratum_key', sa.String(length=255), nullable=False),
+            sa.Column('next_position', sa.Integer(), nullable=False),
+            sa.Column('generated', sa.Integer(), nullable=False),
+            sa.Column('next_block', sa.Integer(), nullable=False),
+            sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['study_id'], ['study.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('study_id', 'stratum_key', name='uix_allocation_sequence')
+        )
+
+    if 'allocation_slot' not in tables:
+        op.create_table('allocation_slot',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sequence_id', sa.Integer(), nullable=False),
+            sa.Column('position', sa.Integer(), nullable=False),
+            sa.Column('block_number', sa.Integer(), nullable=False),
+            sa.Column('block_size', sa.Integer(), nullable=False),
+            sa.Column('treatment_arm_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['sequence_id'], ['allocation_sequence.id']),
+            sa.ForeignKeyConstraint(['treatment_arm_id'], ['treatment_arm.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('sequence_id', 'position', name='uix_allocation_slot')
+        )
+
+
+def downgrade():
+    op.drop_table('allocation_slot')
+    op.drop_table('allocation_sequence')
+    op.drop_index('ix_randomization_site_id', table_name='randomization')
+    op.drop_index('ix_randomization_study_id', table_name='randomization')
+    op.drop_table('randomization')
@@ -0,0 +1,37 @@
+"""minimization counts
+
+Revision ID: b6d04f2e7a38
+Revises: a3c58e9d1f64
+Create Date: 2026-10-16 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d04f2e7a38'
+down_revision = 'a3c58e9d1f64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'minimization_count' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('minimization_count',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('study_id', sa.Integer(), nullable=False),
+        sa.Column('factor', sa.String(length=100), nullable=False),
+        sa.Column('level', sa.String(length=100), nullable=False),
+        sa.Column('treatment_arm_id', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['study_id'], ['study.id']),
+        sa.ForeignKeyConstraint(['treatment_arm_id'], ['treatment_arm.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('study_id', 'factor', 'level', 'treatment_arm_id', name='uix_minimization_count')
+    )
+
+
+def downgrade():
+    op.drop_table('minimization_count')
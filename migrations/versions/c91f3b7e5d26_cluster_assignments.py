@@ -0,0 +1,37 @@
+"""cluster assignments
+
+Revision ID: c91f3b7e5d26
+Revises: b6d04f2e7a38
+Create Date: 2026-10-16 09:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c91f3b7e5d26'
+down_revision = 'b6d04f2e7a38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'cluster_assignment' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('cluster_assignment',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('study_id', sa.Integer(), nullable=False),
+        sa.Column('site_id', sa.Integer(), nullable=False),
+        sa.Column('treatment_arm_id', sa.Integer(), nullable=False),
+        sa.Column('timestamp_created', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['site_id'], ['site.id']),
+        sa.ForeignKeyConstraint(['study_id'], ['study.id']),
+        sa.ForeignKeyConstraint(['treatment_arm_id'], ['treatment_arm.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('study_id', 'site_id', name='uix_cluster_assignment')
+    )
+
+
+def downgrade():
+    op.drop_table('cluster_assignment')
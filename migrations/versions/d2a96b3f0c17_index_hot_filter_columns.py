@@ -0,0 +1,62 @@
+"""index hot filter columns, unique study_site and study_users pairs
+
+Revision ID: d2a96b3f0c17
+Revises: 8c4f7a1e2b90
+Create Date: 2026-10-16 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a96b3f0c17'
+down_revision = '8c4f7a1e2b90'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_patient_study_id', 'patient', ['study_id']),
+    ('ix_patient_site_id', 'patient', ['site_id']),
+    ('ix_patient_variable_variable_id', 'patient_variable', ['variable_id']),
+    ('ix_study_site_site_id', 'study_site', ['site_id']),
+    ('ix_study_users_user_id', 'study_users', ['user_id']),
+    ('ix_study_variable_study_id', 'study_variable', ['study_id']),
+    ('ix_study_created_by', 'study', ['created_by']),
+    ('ix_study_end_date', 'study', ['end_date']),
+    ('ix_study_timestamp_created_id', 'study', ['timestamp_created', 'id']),
+    ('ix_treatment_arm_study_id', 'treatment_arm', ['study_id']),
+]
+
+UNIQUES = [
+    ('uix_study_site', 'study_site', ['study_id', 'site_id']),
+    ('uix_study_user', 'study_users', ['study_id', 'user_id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for name, table, columns in INDEXES:
+        if name not in {i['name'] for i in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+    for name, table, columns in UNIQUES:
+        if name in {u['name'] for u in inspector.get_unique_constraints(table)}:
+            continue
+        # Earlier check-then-insert races may have left duplicate pairs behind
+        op.execute(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {table} GROUP BY {', '.join(columns)})"
+        )
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_unique_constraint(name, columns)
+
+
+def downgrade():
+    for name, table, columns in UNIQUES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(name, type_='unique')
+
+    for name, table, columns in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,29 @@
+"""add study.config_version
+
+Revision ID: e4b7d19c6a53
+Revises: c91f3b7e5d26
+Create Date: 2026-10-16 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7d19c6a53'
+down_revision = 'c91f3b7e5d26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('study')}
+    if 'config_version' in columns:
+        return
+    with op.batch_alter_table('study') as batch_op:
+        batch_op.add_column(sa.Column('config_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('study') as batch_op:
+        batch_op.drop_column('config_version')
@@ -0,0 +1,66 @@
+"""study search indexes (pg_trgm / FTS5)
+
+Revision ID: f7e31a5c8d02
+Revises: d2a96b3f0c17
+Create Date: 2026-10-16 09:20:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7e31a5c8d02'
+down_revision = 'd2a96b3f0c17'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ['name', 'protocol_number', 'irb_number']
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in COLUMNS:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_study_{column}_trgm "
+                f"ON study USING gin ({column} gin_trgm_ops)"
+            )
+
+    elif dialect == 'sqlite':
+        cols = ', '.join(COLUMNS)
+        new = ', '.join(f'new.{c}' for c in COLUMNS)
+        old = ', '.join(f'old.{c}' for c in COLUMNS)
+        # External-content table: the text lives in study, FTS5 only keeps the index
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS study_fts USING fts5("
+            f"{cols}, content='study', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS study_fts_ai AFTER INSERT ON study BEGIN "
+            f"INSERT INTO study_fts(rowid, {cols}) VALUES (new.id, {new}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS study_fts_ad AFTER DELETE ON study BEGIN "
+            f"INSERT INTO study_fts(study_fts, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS study_fts_au AFTER UPDATE ON study BEGIN "
+            f"INSERT INTO study_fts(study_fts, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO study_fts(rowid, {cols}) VALUES (new.id, {new}); END"
+        )
+        op.execute("INSERT INTO study_fts(study_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        for column in COLUMNS:
+            op.execute(f"DROP INDEX IF EXISTS ix_study_{column}_trgm")
+
+    elif dialect == 'sqlite':
+        for trigger in ('study_fts_ai', 'study_fts_ad', 'study_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS study_fts")
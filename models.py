@@ -1,26 +1,54 @@
 # models.py
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import update
 from datetime import datetime
 
 db = SQLAlchemy()
 
+
+def insert_ignore(model, **values):
+    """INSERT that silently skips rows violating a unique key.
+
+    Returns True when a row was written. Lets "assign if not already assigned"
+    be a single statement instead of a SELECT followed by an INSERT.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.exc import IntegrityError
+        try:
+            with db.session.begin_nested():
+                db.session.execute(model.__table__.insert().values(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    result = db.session.execute(insert(model).values(**values).on_conflict_do_nothing())
+    return result.rowcount == 1
+
 class Users(db.Model):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
+    # Deferred: loaded only where a password is checked (see undefer in login)
+    password = db.orm.deferred(db.Column(db.String(200), nullable=False, info={"secret": True}))
     role = db.Column(db.String(20), nullable=False)
     first_name = db.Column(db.String(100))
     last_name = db.Column(db.String(100))
     title = db.Column(db.String(100))
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    timestamp_updated = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
 
 class Patient(db.Model):
     __tablename__ = "patient"
 
     id = db.Column(db.Integer, primary_key=True)
-    study_id = db.Column(db.Integer, nullable=True)
-    site_id = db.Column(db.Integer, nullable=True)
+    study_id = db.Column(db.Integer, nullable=True, index=True)
+    site_id = db.Column(db.Integer, nullable=True, index=True)
     para = db.Column(db.String(4), nullable=False)
     name = db.Column(db.String(255), nullable=False)
     dob = db.Column(db.Date, nullable=False)
@@ -51,6 +79,27 @@ class Site(db.Model):
     timestamp_created = db.Column(db.DateTime, default=datetime.utcnow)
     timestamp_updated = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
+
+class TableVersion(db.Model):
+    """Write counter for tables whose list endpoints send ETags.
+
+    Row aggregates like count(id) and max(id) do not change when a delete is
+    followed by an insert, because SQLite reuses the rowid of a deleted max row.
+    """
+    __tablename__ = "table_version"
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+def bump_table_version(name):
+    """Count a write to table ``name``. Caller commits."""
+    if not insert_ignore(TableVersion, name=name, version=1):
+        db.session.execute(
+            update(TableVersion).where(TableVersion.name == name)
+            .values(version=TableVersion.version + 1)
+        )
+
+
 class Study(db.Model):
     __tablename__ = 'study'
     id = db.Column(db.Integer, primary_key=True)
@@ -58,8 +107,8 @@ class Study(db.Model):
     protocol_number = db.Column(db.String(100))
     irb_number = db.Column(db.String(100))
     start_date = db.Column(db.Date)
-    end_date = db.Column(db.Date, nullable=True)
-    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    end_date = db.Column(db.Date, nullable=True, index=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     updated_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     timestamp_created = db.Column(db.DateTime, default=datetime.utcnow)
     timestamp_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -67,6 +116,8 @@ class Study(db.Model):
     randomization_type = db.Column(db.String(50))  # 'block', 'simple', etc.
     block_size = db.Column(db.Integer)
     stratification_factors = db.Column(db.Text)  # JSON string
+    config_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")  # bumped on config writes
+    members_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")  # bumped on study_users writes
     treatment_arms = db.relationship('TreatmentArm', backref='study', cascade="all, delete", lazy=True)
     # ➕ Relationship to StudySite
     study_sites = db.relationship('StudySite', backref='study', lazy='joined')
@@ -79,11 +130,13 @@ class Study(db.Model):
         foreign_keys='[StudyUser.study_id, StudyUser.user_id]'
     )
 
+    __table_args__ = (db.Index('ix_study_timestamp_created_id', 'timestamp_created', 'id'),)
+
 class StudySite(db.Model):
     __tablename__ = 'study_site'
     id = db.Column(db.Integer, primary_key=True)
     study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False)
-    site_id = db.Column(db.Integer, db.ForeignKey('site.id'), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey('site.id'), nullable=False, index=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     timestamp_created = db.Column(db.DateTime, default=datetime.utcnow)
     timestamp_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -91,20 +144,24 @@ class StudySite(db.Model):
     # ➕ Relationship to Site
     site = db.relationship('Site', backref='study_sites')
 
+    __table_args__ = (db.UniqueConstraint('study_id', 'site_id', name='uix_study_site'),)
+
 # (include Patient, Site, Study, etc. if needed)
 
 class StudyUser(db.Model):
     __tablename__ = 'study_users'
     id = db.Column(db.Integer, primary_key=True)
     study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     timestamp_created = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.UniqueConstraint('study_id', 'user_id', name='uix_study_user'),)
+
 class TreatmentArm(db.Model):
     __tablename__ = 'treatment_arm'
     id = db.Column(db.Integer, primary_key=True)
-    study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False)
+    study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     allocation_ratio = db.Column(db.Integer, default=1)
@@ -115,7 +172,7 @@ class StudyVariable(db.Model):
     __tablename__ = 'study_variable'
 
     id = db.Column(db.Integer, primary_key=True)
-    study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False)
+    study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False, index=True)
     name = db.Column(db.String, nullable=False)
     description = db.Column(db.String, nullable=True)  # e.g., "Tăng huyết áp
     variable_type = db.Column(db.String, nullable=False)  # e.g., text, number, select, etc.
@@ -132,12 +189,82 @@ class PatientVariable(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
-    variable_id = db.Column(db.Integer, db.ForeignKey('study_variable.id'), nullable=False)
+    variable_id = db.Column(db.Integer, db.ForeignKey('study_variable.id'), nullable=False, index=True)
     value = db.Column(db.Text, nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     updated_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     timestamp_created = db.Column(db.DateTime, default=datetime.utcnow)
     timestamp_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    study_variable = db.relationship('StudyVariable')
+
     __table_args__ = (db.UniqueConstraint('patient_id', 'variable_id', name='uix_patient_variable'),)
 
+
+class Randomization(db.Model):
+    __tablename__ = 'randomization'
+
+    id = db.Column(db.Integer, primary_key=True)
+    study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False, index=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False, unique=True)
+    site_id = db.Column(db.Integer, nullable=True, index=True)
+    treatment_arm = db.Column(db.String(100), nullable=False)  # arm name at the time of allocation
+    treatment_arm_id = db.Column(db.Integer, db.ForeignKey('treatment_arm.id'), nullable=True)
+    stratum_key = db.Column(db.String(255), nullable=True)
+    allocation_position = db.Column(db.Integer, nullable=True)  # slot taken from the allocation list
+    stratification_factors = db.Column(db.Text)  # JSON string
+    randomization_date = db.Column(db.DateTime, default=datetime.utcnow)
+    entered_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+
+class AllocationSequence(db.Model):
+    """Pre-generated allocation list of one study stratum and how far it has been used."""
+    __tablename__ = 'allocation_sequence'
+
+    id = db.Column(db.Integer, primary_key=True)
+    study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False)
+    stratum_key = db.Column(db.String(255), nullable=False, default='')
+    next_position = db.Column(db.Integer, nullable=False, default=0)
+    generated = db.Column(db.Integer, nullable=False, default=0)  # slots 0..generated-1 exist
+    next_block = db.Column(db.Integer, nullable=False, default=0)
+    timestamp_created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('study_id', 'stratum_key', name='uix_allocation_sequence'),)
+
+class AllocationSlot(db.Model):
+    __tablename__ = 'allocation_slot'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sequence_id = db.Column(db.Integer, db.ForeignKey('allocation_sequence.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    block_number = db.Column(db.Integer, nullable=False)
+    block_size = db.Column(db.Integer, nullable=False)
+    treatment_arm_id = db.Column(db.Integer, db.ForeignKey('treatment_arm.id'), nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('sequence_id', 'position', name='uix_allocation_slot'),)
+
+class MinimizationCount(db.Model):
+    """Running count of patients per (factor level, arm) for Pocock–Simon minimization."""
+    __tablename__ = 'minimization_count'
+
+    id = db.Column(db.Integer, primary_key=True)
+    study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False)
+    factor = db.Column(db.String(100), nullable=False)
+    level = db.Column(db.String(100), nullable=False)
+    treatment_arm_id = db.Column(db.Integer, db.ForeignKey('treatment_arm.id'), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('study_id', 'factor', 'level', 'treatment_arm_id', name='uix_minimization_count'),
+    )
+
+class ClusterAssignment(db.Model):
+    """Arm allocated to a whole site under cluster randomization."""
+    __tablename__ = 'cluster_assignment'
+
+    id = db.Column(db.Integer, primary_key=True)
+    study_id = db.Column(db.Integer, db.ForeignKey('study.id'), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey('site.id'), nullable=False)
+    treatment_arm_id = db.Column(db.Integer, db.ForeignKey('treatment_arm.id'), nullable=False)
+    timestamp_created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('study_id', 'site_id', name='uix_cluster_assignment'),)
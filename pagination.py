@@ -0,0 +1,87 @@
+# pagination.py
+"""Keyset (cursor) pagination.
+
+Opt-in on list endpoints with ``?cursor=&limit=``: an empty cursor asks for
+the first page, and each response carries ``next_cursor`` (None on the last
+page). Rows are ordered descending on the given columns, the last of which
+must be unique (normally the primary key), so pages never skip or repeat rows
+and deep pages cost the same as the first one.
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def cursor_requested():
+    return "cursor" in request.args
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_decode_value(v) for v in json.loads(raw)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if len(values) != size:
+        raise InvalidCursor("cursor does not match this listing")
+    return values
+
+
+def _after(columns, values):
+    # (c1, c2, ...) < (v1, v2, ...) spelled out, since row-value comparison
+    # is not available on every backend
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal, column < value))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns, cursor=None, limit=None, key=None):
+    """Return ``(items, next_cursor)`` for one page of ``query``.
+
+    ``key`` extracts the ordering values from a result row; by default they
+    are read as attributes named after the columns.
+    """
+    limit = min(max(limit or DEFAULT_LIMIT, 1), MAX_LIMIT)
+    if key is None:
+        names = [c.key for c in columns]
+        key = lambda row: [getattr(row, n) for n in names]
+
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, len(columns))))
+
+    rows = query.order_by(*[c.desc() for c in columns]).limit(limit + 1).all()
+    next_cursor = encode_cursor(key(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def page_args():
+    return request.args.get("cursor", "", type=str), request.args.get("limit", DEFAULT_LIMIT, type=int)
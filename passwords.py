@@ -0,0 +1,179 @@
+"""Password hashing with cross-process admission control.
+
+scrypt and PBKDF2 are slow on purpose, tens to hundreds of milliseconds of
+CPU per call. Under a login burst every gunicorn worker can end up inside a
+KDF, and the rest of the API stalls behind them.
+
+At most PASSWORD_HASH_SLOTS hashes of one app run at once, counted across
+every worker process and thread. A slot is an exclusive flock() on one of
+PASSWORD_HASH_SLOTS files in the lock directory, by default
+``<instance path>/password-hash-slots`` (PASSWORD_HASH_LOCK_DIR overrides it),
+so two apps on one host do not share slots. The kernel releases a slot if a
+worker dies mid-hash. A call that finds no free slot retries for up to
+PASSWORD_HASH_WAIT seconds, then raises PasswordHashBusy, which init_app()
+turns into 503 + Retry-After. This also works with the default sync workers,
+where each process serves one request at a time: the login that would be the
+(SLOTS+1)th concurrent hash is shed and its worker goes straight back to the
+accept queue, instead of a per-process limit that a single request can never
+reach. Without fcntl (Windows), or when the lock directory cannot be used,
+slots fall back to a per-process semaphore.
+
+Hashes run on the calling thread: hashlib releases the GIL inside the KDF,
+so gthread workers hash in parallel without a pool. Only gevent workers hand
+the call to gevent's pool of native threads, since a KDF on a greenlet would
+block the whole loop.
+
+PASSWORD_HASH_METHOD takes any werkzeug method string, for example
+``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. Stored hashes with
+different parameters still verify. needs_rehash() flags them, so login can
+upgrade them in place.
+"""
+import os
+import random
+import sys
+import time
+from functools import lru_cache
+from threading import BoundedSemaphore, Lock
+
+from flask import jsonify
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+PASSWORD_HASH_SLOTS = int(os.environ.get("PASSWORD_HASH_SLOTS", min(os.cpu_count() or 1, 4)))
+# Set by init_app(); until then, and if it cannot be created, slots are per process
+PASSWORD_HASH_LOCK_DIR = None
+PASSWORD_HASH_WAIT = float(os.environ.get("PASSWORD_HASH_WAIT", 0.5))
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get("PASSWORD_HASH_RETRY_AFTER", 2))
+# Between attempts to find a free slot
+POLL_INTERVAL = 0.01
+
+_gevent_pool = _local_slots = None
+_init_lock = Lock()
+_warned = False
+
+
+class PasswordHashBusy(Exception):
+    """Too many hashes in flight across this app's workers; the caller should retry later."""
+
+
+def _gevent_patched():
+    gevent_monkey = sys.modules.get("gevent.monkey")
+    return gevent_monkey is not None and gevent_monkey.is_module_patched("threading")
+
+
+def _try_slot():
+    """Lock a free slot file; returns its fd, or None when every slot is taken."""
+    first = random.randrange(PASSWORD_HASH_SLOTS)  # spread callers over the slots
+    for i in range(PASSWORD_HASH_SLOTS):
+        path = os.path.join(PASSWORD_HASH_LOCK_DIR, f"slot-{(first + i) % PASSWORD_HASH_SLOTS}")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except OSError as e:
+            os.close(fd)
+            if not isinstance(e, BlockingIOError):
+                raise
+    return None
+
+
+def _acquire():
+    if fcntl is not None and PASSWORD_HASH_LOCK_DIR is not None:
+        try:
+            return _acquire_slot()
+        except OSError as e:  # e.g. slot files left behind by another user
+            _warn_local(e)
+    return _acquire_local()
+
+
+def _acquire_slot():
+    deadline = time.monotonic() + PASSWORD_HASH_WAIT
+    while (fd := _try_slot()) is None:
+        if time.monotonic() >= deadline:
+            raise PasswordHashBusy()
+        time.sleep(POLL_INTERVAL)  # yields to other greenlets under gevent
+    return fd
+
+
+def _acquire_local():
+    global _local_slots
+    with _init_lock:
+        if _local_slots is None:
+            _local_slots = BoundedSemaphore(PASSWORD_HASH_SLOTS)
+    if not _local_slots.acquire(timeout=PASSWORD_HASH_WAIT):
+        raise PasswordHashBusy()
+    return None
+
+
+def _warn_local(error):
+    global _warned
+    if not _warned:
+        _warned = True
+        print("⚠️ Password hash slots unavailable, limiting per process only:", error)
+
+
+def _release(fd):
+    if fd is None:
+        _local_slots.release()
+    else:
+        os.close(fd)  # closing the only descriptor drops the flock
+
+
+def _call(fn, *args):
+    global _gevent_pool
+    if not _gevent_patched():
+        return fn(*args)
+    # Built on first use: a gevent worker monkey-patches after this module may have been imported
+    with _init_lock:
+        if _gevent_pool is None:
+            from gevent.threadpool import ThreadPool
+            _gevent_pool = ThreadPool(PASSWORD_HASH_SLOTS)
+    return _gevent_pool.apply(fn, args)
+
+
+def _run(fn, *args):
+    fd = _acquire()
+    try:
+        return _call(fn, *args)
+    finally:
+        _release(fd)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+@lru_cache(maxsize=None)
+def _current_prefix():
+    # Let werkzeug expand defaults ("scrypt" -> "scrypt:32768:8:1") rather than duplicating them
+    return generate_password_hash("", PASSWORD_HASH_METHOD).split("$", 1)[0]
+
+
+def needs_rehash(pwhash):
+    """True when ``pwhash`` was made with other parameters than PASSWORD_HASH_METHOD."""
+    return pwhash.split("$", 1)[0] != _current_prefix()
+
+
+def init_app(app):
+    global PASSWORD_HASH_LOCK_DIR
+    lock_dir = os.environ.get("PASSWORD_HASH_LOCK_DIR") or os.path.join(app.instance_path, "password-hash-slots")
+    try:
+        os.makedirs(lock_dir, exist_ok=True)
+        PASSWORD_HASH_LOCK_DIR = lock_dir
+    except OSError as e:
+        _warn_local(e)
+
+    @app.errorhandler(PasswordHashBusy)
+    def _busy(error):
+        response = jsonify({"success": False, "message": "Server busy, please retry"})
+        response.headers["Retry-After"] = str(PASSWORD_HASH_RETRY_AFTER)
+        return response, 503
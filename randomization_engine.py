@@ -0,0 +1,336 @@
+# randomization_engine.py
+"""Permuted-block allocation lists.
+
+Every (study, stratum) owns an AllocationSequence: a pre-generated list of
+AllocationSlot rows, each naming the arm for one position, built from whole
+permuted blocks. A draw atomically advances the sequence's ``next_position``
+pointer and reads the slot(s) it just reserved, so taking the next allocation
+is O(1) and two workers can never hand out the same slot: the UPDATE locks
+the sequence row until the enclosing transaction commits or rolls back.
+"""
+import json
+import os
+import random
+from itertools import product
+from threading import Lock
+
+from cachetools import LRUCache
+from sqlalchemy import select, update
+from models import (
+    db, AllocationSequence, AllocationSlot, MinimizationCount, ClusterAssignment, Randomization, insert_ignore
+)
+
+# Slots generated per top-up, rounded up to whole blocks
+GENERATE_AHEAD = 200
+# Probability of taking the least-imbalanced arm under minimization
+MINIMIZATION_P = 0.8
+
+_rng = random.SystemRandom()  # allocation concealment: not reproducible from a seed
+
+# (study_id, site_id) -> arm id; cluster assignments never change once made
+_cluster_cache = LRUCache(maxsize=int(os.environ.get("CLUSTER_CACHE_SIZE", 10000)))
+_cluster_lock = Lock()
+
+
+class AllocationError(Exception):
+    pass
+
+
+def block_unit(arms):
+    """Smallest block that honours every arm's allocation_ratio."""
+    return sum(max(arm.allocation_ratio or 1, 1) for arm in arms)
+
+
+def block_sizes(arms, block_size=None):
+    """Block sizes to draw from, varied to keep the end of a block unpredictable.
+
+    ``Study.block_size`` is the largest block; it is rounded down to a
+    multiple of the ratio unit and paired with the next smaller multiple.
+    """
+    unit = block_unit(arms)
+    top = max((block_size or 0) // unit, 1) * unit
+    return sorted({size for size in (top - unit, top) if size >= unit})
+
+
+def permuted_block(arms, size, rng=_rng):
+    """One block of arm ids of ``size`` with the arms' ratios, in random order."""
+    repeats = size // block_unit(arms)
+    block = [arm.id for arm in arms for _ in range(max(arm.allocation_ratio or 1, 1) * repeats)]
+    rng.shuffle(block)
+    return block
+
+
+def generate_blocks(arms, block_size, count, first_block=0, rng=_rng):
+    """Yield ``(block_number, block_size, arm_id)`` for whole blocks covering ``count`` slots."""
+    sizes = block_sizes(arms, block_size)
+    produced, block_number = 0, first_block
+    while produced < count:
+        size = rng.choice(sizes)
+        for arm_id in permuted_block(arms, size, rng):
+            yield block_number, size, arm_id
+        produced += size
+        block_number += 1
+
+
+def sequence_id(study_id, stratum_key=""):
+    insert_ignore(AllocationSequence, study_id=study_id, stratum_key=stratum_key)
+    return db.session.execute(
+        select(AllocationSequence.id)
+        .where(AllocationSequence.study_id == study_id, AllocationSequence.stratum_key == stratum_key)
+    ).scalar_one()
+
+
+def extend_sequence(seq_id, arms, block_size, until):
+    """Append whole blocks until at least ``until`` slots exist. Caller holds the row lock."""
+    generated, next_block = db.session.execute(
+        select(AllocationSequence.generated, AllocationSequence.next_block)
+        .where(AllocationSequence.id == seq_id)
+    ).one()
+    if generated >= until:
+        return
+
+    rows, position, last_block = [], generated, next_block - 1
+    for block_number, size, arm_id in generate_blocks(arms, block_size, until - generated + GENERATE_AHEAD, next_block):
+        rows.append({
+            "sequence_id": seq_id,
+            "position": position,
+            "block_number": block_number,
+            "block_size": size,
+            "treatment_arm_id": arm_id,
+        })
+        position += 1
+        last_block = block_number
+
+    db.session.execute(AllocationSlot.__table__.insert(), rows)
+    db.session.execute(
+        update(AllocationSequence)
+        .where(AllocationSequence.id == seq_id)
+        .values(generated=position, next_block=last_block + 1)
+    )
+
+
+def pregenerate(study, arms, stratum_key, slots):
+    """Make sure a stratum has at least ``slots`` slots generated."""
+    seq_id = sequence_id(study.id, stratum_key)
+    db.session.execute(
+        select(AllocationSequence.id).where(AllocationSequence.id == seq_id).with_for_update()
+    )
+    extend_sequence(seq_id, arms, study.block_size, slots)
+
+
+def draw(study, arms, stratum_key="", count=1):
+    """Reserve the next ``count`` slots of a stratum; returns ``[(position, arm_id)]`` in order.
+
+    Runs inside the caller's transaction: a rollback returns the slots.
+    """
+    seq_id = sequence_id(study.id, stratum_key)
+    end = db.session.execute(
+        update(AllocationSequence)
+        .where(AllocationSequence.id == seq_id)
+        .values(next_position=AllocationSequence.next_position + count)
+        .returning(AllocationSequence.next_position)
+    ).scalar_one()
+    start = end - count
+
+    extend_sequence(seq_id, arms, study.block_size, end)
+
+    slots = db.session.execute(
+        select(AllocationSlot.position, AllocationSlot.treatment_arm_id)
+        .where(
+            AllocationSlot.sequence_id == seq_id,
+            AllocationSlot.position >= start,
+            AllocationSlot.position < end
+        )
+        .order_by(AllocationSlot.position)
+    ).all()
+
+    arm_ids = {arm.id for arm in arms}
+    if len(slots) != count or any(arm_id not in arm_ids for _, arm_id in slots):
+        raise AllocationError("Allocation list does not match the study's treatment arms")
+    return [tuple(slot) for slot in slots]
+
+
+def discard_unused_slots(study_id):
+    """Drop not-yet-used slots after the arms or block size change; they are
+    regenerated from the current configuration on the next draw."""
+    sequences = db.session.execute(
+        select(AllocationSequence.id, AllocationSequence.next_position)
+        .where(AllocationSequence.study_id == study_id)
+        .with_for_update()
+    ).all()
+    for seq_id, next_position in sequences:
+        used_blocks = db.session.execute(
+            select(db.func.max(AllocationSlot.block_number))
+            .where(AllocationSlot.sequence_id == seq_id, AllocationSlot.position < next_position)
+        ).scalar()
+        db.session.execute(
+            AllocationSlot.__table__.delete()
+            .where(AllocationSlot.sequence_id == seq_id, AllocationSlot.position >= next_position)
+        )
+        db.session.execute(
+            update(AllocationSequence)
+            .where(AllocationSequence.id == seq_id)
+            .values(generated=next_position, next_block=(used_blocks if used_blocks is not None else -1) + 1)
+        )
+
+
+def arm_in_use(arm_id):
+    """True once an allocation, randomization or cluster assignment references the arm.
+
+    Call after discard_unused_slots(): slots still naming the arm are then used ones.
+    """
+    return any(
+        db.session.execute(select(column).where(column == arm_id, *extra).limit(1)).first() is not None
+        for column, *extra in (
+            (AllocationSlot.treatment_arm_id,),
+            (Randomization.treatment_arm_id,),
+            (ClusterAssignment.treatment_arm_id,),
+            (MinimizationCount.treatment_arm_id, MinimizationCount.count > 0),
+        )
+    )
+
+
+# --- Stratification ---
+
+def parse_factors(stratification_factors):
+    """Read Study.stratification_factors into ``[(factor, levels or None)]``.
+
+    Accepts ``{"sex": ["F", "M"], ...}``, ``[{"name": "sex", "levels": [...]}, ...]``
+    or a plain list of factor names (levels then become known as patients arrive).
+    """
+    if not stratification_factors:
+        return []
+    try:
+        factors = json.loads(stratification_factors)
+    except ValueError:
+        factors = [f.strip() for f in stratification_factors.split(",") if f.strip()]
+
+    if isinstance(factors, str):
+        factors = [factors]
+    if isinstance(factors, dict):
+        return [(str(name), [str(level) for level in levels] if levels else None) for name, levels in factors.items()]
+
+    parsed = []
+    for factor in factors:
+        if isinstance(factor, dict):
+            levels = factor.get("levels")
+            parsed.append((str(factor["name"]), [str(level) for level in levels] if levels else None))
+        else:
+            parsed.append((str(factor), None))
+    return parsed
+
+
+def factor_levels(factors, values):
+    """The patient's level for every factor, checked against the declared levels."""
+    levels = []
+    for name, allowed in factors:
+        value = values.get(name)
+        if value in (None, ""):
+            raise AllocationError(f"Missing stratification value: {name}")
+        value = str(value)
+        if allowed is not None and value not in allowed:
+            raise AllocationError(f"Invalid value for {name}: {value}")
+        levels.append((name, value))
+    return levels
+
+
+def make_stratum_key(levels):
+    return "|".join(f"{name}={value}" for name, value in levels)
+
+
+def all_strata(factors):
+    """Every stratum key, or None when some factor has no declared levels."""
+    if any(levels is None for _, levels in factors):
+        return None
+    names = [name for name, _ in factors]
+    return [make_stratum_key(zip(names, combo)) for combo in product(*[levels for _, levels in factors])]
+
+
+# --- Minimization (Pocock–Simon) ---
+
+def _count_rows(study_id, levels, arms):
+    factor_filter = db.or_(*[
+        db.and_(MinimizationCount.factor == name, MinimizationCount.level == value) for name, value in levels
+    ])
+    # Locked in id order so concurrent allocations queue up instead of deadlocking
+    return db.session.execute(
+        select(MinimizationCount.id, MinimizationCount.factor, MinimizationCount.treatment_arm_id, MinimizationCount.count)
+        .where(
+            MinimizationCount.study_id == study_id,
+            MinimizationCount.treatment_arm_id.in_([arm.id for arm in arms]),
+            factor_filter
+        )
+        .order_by(MinimizationCount.id)
+        .with_for_update()
+    ).all()
+
+
+def minimize(study, arms, levels, rng=_rng):
+    """Allocate by minimising the ratio-weighted range of arm counts over the
+    patient's factor levels, then record the allocation. O(factors × arms)."""
+    rows = _count_rows(study.id, levels, arms)
+    if len(rows) < len(levels) * len(arms):
+        for (name, value), arm in product(levels, arms):
+            insert_ignore(MinimizationCount, study_id=study.id, factor=name, level=value, treatment_arm_id=arm.id)
+        rows = _count_rows(study.id, levels, arms)
+
+    counts = {(factor, arm_id): (row_id, count) for row_id, factor, arm_id, count in rows}
+    ratios = {arm.id: max(arm.allocation_ratio or 1, 1) for arm in arms}
+
+    def imbalance(candidate):
+        total = 0.0
+        for name, _ in levels:
+            weighted = [
+                (counts[(name, arm.id)][1] + (arm.id == candidate)) / ratios[arm.id] for arm in arms
+            ]
+            total += max(weighted) - min(weighted)
+        return total
+
+    scores = {arm.id: imbalance(arm.id) for arm in arms}
+    best = min(scores.values())
+    preferred = [arm for arm in arms if scores[arm.id] == best]
+    others = [arm for arm in arms if scores[arm.id] != best]
+    if others and rng.random() >= MINIMIZATION_P:
+        chosen = rng.choice(others)
+    else:
+        chosen = rng.choice(preferred)
+
+    db.session.execute(
+        update(MinimizationCount)
+        .where(MinimizationCount.id.in_([counts[(name, chosen.id)][0] for name, _ in levels]))
+        .values(count=MinimizationCount.count + 1)
+    )
+    return chosen
+
+
+# --- Cluster randomization ---
+
+def cluster_arm_id(study, arms, site_id):
+    """Arm of a site under cluster randomization, assigning one on first use.
+
+    The first patient at a site picks an arm at random and claims it with an
+    insert-if-absent on (study_id, site_id); whoever loses a race simply reads
+    the winner's arm. Assignments are cached per process once committed.
+    """
+    key = (study.id, int(site_id))
+    arm_ids = {arm.id for arm in arms}
+    with _cluster_lock:
+        arm_id = _cluster_cache.get(key)
+    if arm_id in arm_ids:
+        return arm_id
+
+    inserted = insert_ignore(
+        ClusterAssignment, study_id=study.id, site_id=key[1], treatment_arm_id=_rng.choice(arms).id
+    )
+    arm_id = db.session.execute(
+        select(ClusterAssignment.treatment_arm_id)
+        .where(ClusterAssignment.study_id == study.id, ClusterAssignment.site_id == key[1])
+    ).scalar_one()
+    if arm_id not in arm_ids:
+        raise AllocationError("Site is assigned to an arm that no longer exists")
+
+    # Our own insert is not committed yet, so only cache rows that already existed
+    if not inserted:
+        with _cluster_lock:
+            _cluster_cache[key] = arm_id
+    return arm_id
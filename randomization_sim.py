@@ -0,0 +1,132 @@
+# randomization_sim.py
+"""Monte Carlo simulation of allocation schedules.
+
+Every simulated trial is a row of a NumPy array, so thousands of trials are
+generated and scored in a handful of vector operations. Used by
+``flask randomization simulate`` for protocol sign-off: it reports how far the
+arms drift apart (ratio-weighted imbalance) and how often an investigator who
+always guesses the currently under-represented arm would guess right.
+"""
+import time
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+STRATEGIES = ("simple", "block", "stratified", "minimization")
+
+
+def _block_schedules(rng, ratios, sizes, trials, n):
+    """``(trials, n)`` arm indexes from permuted blocks of randomly chosen sizes."""
+    unit = ratios.sum()
+    sizes = np.asarray(sizes)
+    n_blocks = -(-n // sizes.min())
+    chosen = rng.choice(sizes, size=(trials, n_blocks))
+
+    # Blocks are laid out padded to the largest size, then the padding is squeezed out
+    blocks = np.full((trials, n_blocks, sizes.max()), -1, dtype=np.int16)
+    for size in sizes:
+        mask = chosen == size
+        if not mask.any():
+            continue
+        base = np.repeat(np.arange(len(ratios)), ratios * (size // unit))
+        blocks[mask, :size] = base[rng.random((mask.sum(), size)).argsort(axis=1)]
+
+    flat = blocks.reshape(trials, -1)
+    order = np.argsort(flat < 0, axis=1, kind="stable")
+    return np.take_along_axis(flat, order, axis=1)[:, :n]
+
+
+def _weighted_counts(assign, ratios):
+    onehot = assign[..., None] == np.arange(len(ratios))
+    return onehot, onehot.cumsum(axis=1) / ratios
+
+
+def _guess_correct(assign, ratios):
+    """Chance, per position, that guessing the under-represented arm is right."""
+    onehot, counts = _weighted_counts(assign, ratios)
+    before = counts - onehot / ratios
+    guess = before == before.min(axis=-1, keepdims=True)
+    return (guess & onehot).any(axis=-1) / guess.sum(axis=-1)
+
+
+def _summary(values):
+    summary = {"mean": float(values.mean()), "max": float(values.max())}
+    summary.update({f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES})
+    return summary
+
+
+def _minimization(rng, ratios, factor_levels, trials, n, p):
+    k, n_factors = len(ratios), len(factor_levels)
+    levels = np.stack([rng.integers(0, size, size=(trials, n)) for size in factor_levels], axis=-1)
+    counts = np.zeros((trials, n_factors, max(factor_levels), k))
+    assign = np.empty((trials, n), dtype=np.int16)
+    correct = np.empty((trials, n))
+    rows, factors, eye = np.arange(trials)[:, None], np.arange(n_factors), np.eye(k)
+
+    for i in range(n):
+        current = counts[rows, factors, levels[:, i, :]]  # (trials, factors, arms)
+        candidate = (current[:, None, :, :] + eye[None, :, None, :]) / ratios
+        score = (candidate.max(axis=-1) - candidate.min(axis=-1)).sum(axis=-1)
+        best = (score + rng.random(score.shape) * 1e-9).argmin(axis=1)  # random tie-break
+        other = rng.integers(0, k - 1, size=trials) if k > 1 else best
+        other = other + (other >= best)
+        chosen = np.where(rng.random(trials) < p, best, other) if k > 1 else best
+        assign[:, i] = chosen
+        correct[:, i] = chosen == best
+        counts[rows, factors, levels[:, i, :], chosen[:, None]] += 1
+    return assign, correct
+
+
+def simulate(strategy, ratios, block_sizes=None, n_patients=100, trials=10000,
+             n_strata=1, factor_levels=None, minimization_p=0.8, seed=None):
+    """Simulate ``trials`` trials of ``n_patients`` and summarise balance and predictability.
+
+    ``factor_levels`` (number of levels per factor) is only used by minimization;
+    stratified trials spread patients uniformly over ``n_strata`` strata.
+    """
+    rng = np.random.default_rng(seed)
+    ratios = np.asarray(ratios, dtype=np.int64)
+    started = time.perf_counter()
+
+    if strategy == "simple":
+        assign = rng.choice(len(ratios), size=(trials, n_patients), p=ratios / ratios.sum())
+        correct = _guess_correct(assign, ratios)
+    elif strategy == "block":
+        assign = _block_schedules(rng, ratios, block_sizes, trials, n_patients)
+        correct = _guess_correct(assign, ratios)
+    elif strategy == "stratified":
+        strata = rng.integers(0, n_strata, size=(trials, n_patients))
+        onehot = strata[..., None] == np.arange(n_strata)
+        rank = (onehot.cumsum(axis=1) - 1)[onehot].reshape(trials, n_patients)
+        schedules = np.stack([
+            _block_schedules(rng, ratios, block_sizes, trials, n_patients) for _ in range(n_strata)
+        ])
+        assign = schedules[strata, np.arange(trials)[:, None], rank]
+        # The guesser follows each stratum's own sequence
+        correct = np.zeros((trials, n_patients))
+        for s in range(n_strata):
+            used = np.arange(n_patients) < onehot[..., s].sum(axis=1, keepdims=True)
+            correct += np.where(used, _guess_correct(schedules[s], ratios), 0)
+        correct = correct.sum(axis=1) / n_patients
+    elif strategy == "minimization":
+        if not factor_levels:
+            raise ValueError("Minimization needs at least one stratification factor")
+        assign, correct = _minimization(rng, ratios, factor_levels, trials, n_patients, minimization_p)
+    else:
+        raise ValueError(f"Unsupported randomization type: {strategy}")
+
+    _, counts = _weighted_counts(assign, ratios)
+    imbalance = counts.max(axis=-1) - counts.min(axis=-1)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "strategy": strategy,
+        "trials": trials,
+        "patients": n_patients,
+        "seconds": round(elapsed, 3),
+        "allocations_per_second": round(trials * n_patients / elapsed) if elapsed else None,
+        "final_imbalance": _summary(imbalance[:, -1]),
+        "max_running_imbalance": _summary(imbalance.max(axis=1)),
+        "correct_guess_rate": float(np.mean(correct)),
+        "chance_guess_rate": float(ratios.max() / ratios.sum()),
+    }
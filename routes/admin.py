@@ -0,0 +1,12 @@
+# routes/admin.py
+from flask import Blueprint, jsonify
+from auth import roles_required
+from db_pool import pool_stats
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+# GET: Connection pool usage and checkout wait times (admin only)
+@admin_bp.route('/db-pool', methods=['GET'])
+@roles_required("admin")
+def get_pool_stats():
+    return jsonify(pool_stats()), 200
@@ -0,0 +1,53 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, create_access_token, get_jwt_identity
+from sqlalchemy.orm import undefer
+from models import db, Users
+from auth import roles_required, invalidate_user, build_claims, bump_token_version
+from passwords import hash_password, verify_password, needs_rehash
+
+auth_bp = Blueprint('auth', __name__)
+
+@auth_bp.route("/login", methods=["POST"])
+def login():
+    data = request.get_json()
+    user = Users.query.options(undefer(Users.password)).filter_by(username=data["username"]).first()
+    if user and verify_password(user.password, data["password"]):
+        if needs_rehash(user.password):
+            # 🔁 Hash parameters changed since this one was stored: upgrade it while we have the plain text
+            user.password = hash_password(data["password"])
+            db.session.commit()
+        access_token = create_access_token(identity=str(user.id), additional_claims=build_claims(user))
+        return jsonify({"success": True, "role": user.role, "token": access_token})
+    return jsonify({"success": False, "message": "Invalid credentials"}), 401
+
+#user
+@auth_bp.route("/users", methods=["POST"])
+@roles_required("admin")
+def create_user():
+    data = request.get_json()
+    hashed_pw = hash_password(data["password"])
+    new_user = Users(username=data["username"], password=hashed_pw, role=data["role"])
+    db.session.add(new_user)
+    db.session.commit()
+    return jsonify({"success": True, "message": "User created successfully."})
+
+@auth_bp.route('/change-password', methods=['POST'])
+@jwt_required()
+def change_password():
+    data = request.get_json()
+    old_pw = data.get('oldPassword')
+    new_pw = data.get('newPassword')
+    if not old_pw or not new_pw:
+        return jsonify({"success": False, "message": "Missing password fields"}), 400
+
+    user = Users.query.options(undefer(Users.password)).get(get_jwt_identity())
+    if not user or not verify_password(user.password, old_pw):
+        return jsonify({"success": False, "message": "Incorrect old password"}), 400
+
+    user.password = hash_password(new_pw)
+    bump_token_version(user.id)
+    db.session.commit()
+    invalidate_user(user.id)
+    # Every earlier token, including the one used here, is now revoked
+    access_token = create_access_token(identity=str(user.id), additional_claims=build_claims(user))
+    return jsonify({"success": True, "message": "Password updated successfully", "token": access_token})
@@ -1,10 +1,23 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
 from models import db, Patient, PatientVariable
-from datetime import datetime
+from study_config import get_study_config
+from auth import get_current_user
+from serializers import PATIENT, PATIENT_VARIABLE
+from datetime import datetime, date
+import csv, json
 
 patients_bp = Blueprint("patients", __name__, url_prefix="/api/patients")
 
+
+def _as_date(value):
+    # Date columns need date objects on every backend, not just PostgreSQL
+    from dateutil.parser import parse  # deferred: only writes need it, and it slows worker boot
+    return parse(value).date() if isinstance(value, str) and value else value
+
+
 @patients_bp.route("", methods=["POST"])
 @jwt_required()
 def create_patient():
@@ -13,10 +26,10 @@ def create_patient():
         user_id = get_jwt_identity()
         now = datetime.utcnow()
 
-        # ✅ Create patient (basic info)
-        patient = Patient(
+        # ✅ Create patient (basic info) — core INSERT, the id comes back via RETURNING where supported
+        patient_id = db.session.execute(insert(Patient).values(
             name=data.get("name"),
-            dob=data.get("dob"),
+            dob=_as_date(data.get("dob")),
             sex=data.get("sex"),
             para=data.get("para"),
             phone=data.get("phone"),
@@ -24,7 +37,7 @@ def create_patient():
             ethnicity=data.get("ethnicity"),
             pregnancy_status=data.get("pregnancy_status"),
             notes=data.get("notes"),
-            consent_date=data.get("consent_date"),
+            consent_date=_as_date(data.get("consent_date")),
             enrollment_status=data.get("enrollment_status"),
             is_active=data.get("is_active", True),
             study_id=data.get("study_id"),
@@ -33,45 +46,22 @@ def create_patient():
             updated_by=user_id,
             timestamp_created=now,
             timestamp_updated=now
-        )
-        db.session.add(patient)
-        db.session.flush()  # Important: get patient.id now without committing yet
-
-        # ✅ Insert study variables
-        study_vars = data.get("study_variables", [])  # list of dicts
+        )).inserted_primary_key[0]
 
-        for var in study_vars:
-            variable_id = var.get("variable_id")
+        # ✅ Insert study variables in a single executemany
+        values = {}
+        for var in data.get("study_variables", []):  # list of dicts
             value = var.get("value")
-
-            # 🔥 Check if multiselect
+            # 🔥 Multiselect: one row per (patient, variable) is enforced, so store the list as JSON
             if isinstance(value, list):
-                for v in value:
-                    patient_var = PatientVariable(
-                        patient_id=patient.id,
-                        variable_id=variable_id,
-                        value=v,
-                        created_by=user_id,
-                        updated_by=user_id,
-                        timestamp_created=now,
-                        timestamp_updated=now
-                    )
-                    db.session.add(patient_var)
-            else:
-                # Single value
-                patient_var = PatientVariable(
-                    patient_id=patient.id,
-                    variable_id=variable_id,
-                    value=value,
-                    created_by=user_id,
-                    updated_by=user_id,
-                    timestamp_created=now,
-                    timestamp_updated=now
-                )
-                db.session.add(patient_var)
+                value = json.dumps(value, ensure_ascii=False)
+            values[var.get("variable_id")] = value
+
+        if values:
+            db.session.execute(insert(PatientVariable), _variable_rows(patient_id, values, user_id, now))
 
         db.session.commit()
-        return jsonify({"message": "✅ Patient and variables saved"}), 201
+        return jsonify({"message": "✅ Patient and variables saved", "id": patient_id}), 201
 
     except Exception as e:
         db.session.rollback()
@@ -81,43 +71,322 @@ def create_patient():
 @jwt_required()
 def get_patient(patient_id):
     try:
-        patient = Patient.query.get_or_404(patient_id)
-
-        # Core patient info
-        patient_data = {
-            "id": patient.id,
-            "name": patient.name,
-            "dob": patient.dob.isoformat() if patient.dob else None,
-            "sex": patient.sex,
-            "para": patient.para,
-            "phone": patient.phone,
-            "email": patient.email,
-            "ethnicity": patient.ethnicity,
-            "pregnancy_status": patient.pregnancy_status,
-            "notes": patient.notes,
-            "consent_date": patient.consent_date.isoformat() if patient.consent_date else None,
-            "enrollment_status": patient.enrollment_status,
-            "is_active": patient.is_active,
-            "study_id": patient.study_id,
-            "site_id": patient.site_id,
-        }
-
-        # Study variables
-        variable_data = []
-        for pv in patient.patient_variables:
-            variable_data.append({
-                "variable_id": pv.variable_id,
-                "variable_name": pv.study_variable.name,
-                "variable_description": pv.study_variable.description,
-                "value": pv.value,
-                "type": pv.study_variable.variable_type,
-                "required": pv.study_variable.required
-            })
+        patient = Patient.query.options(
+            selectinload(Patient.patient_variables).joinedload(PatientVariable.study_variable)
+        ).get_or_404(patient_id)
 
         return jsonify({
-            "patient": patient_data,
-            "variables": variable_data
+            "patient": PATIENT.one(patient),
+            "variables": PATIENT_VARIABLE.many(patient.patient_variables)
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+# --- Bulk import ---
+
+PATIENT_FIELDS = (
+    "name", "dob", "sex", "para", "phone", "email", "ethnicity", "pregnancy_status",
+    "notes", "consent_date", "enrollment_status", "is_active", "site_id"
+)
+REQUIRED_PATIENT_FIELDS = ("name", "dob", "sex", "para")
+DATE_FIELDS = ("dob", "consent_date")
+BULK_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+MULTISELECT_SEPARATOR = "|"  # between values of a multiselect cell in CSV
+
+
+def _parse_options(options):
+    if not options:
+        return None
+    try:
+        parsed = json.loads(options)
+        if isinstance(parsed, list):
+            return {str(o) for o in parsed}
+    except ValueError:
+        pass
+    return {o.strip() for o in options.split(",") if o.strip()}
+
+
+def _variable_definitions(config):
+    return {
+        v.id: {
+            "id": v.id,
+            "name": v.name,
+            "type": (v.variable_type or "").lower(),
+            "required": bool(v.required),
+            "options": _parse_options(v.options),
+        }
+        for v in (config.variables if config else ())
+    }
+
+
+def _check_value(definition, value):
+    """Return the value as stored in PatientVariable.value, or raise ValueError."""
+    kind = definition["type"]
+    options = definition["options"]
+
+    if kind == "multiselect":
+        values = value if isinstance(value, list) else [v for v in str(value).split(MULTISELECT_SEPARATOR) if v]
+        if options and not set(map(str, values)) <= options:
+            raise ValueError("invalid option(s)")
+        # One row per (patient, variable) is enforced, so the list is stored as JSON
+        return json.dumps(values, ensure_ascii=False)
+
+    value = str(value)
+    if kind == "number":
+        float(value)
+    elif kind == "date":
+        date.fromisoformat(value)
+    elif kind == "select" and options and value not in options:
+        raise ValueError(f"'{value}' is not an allowed option")
+    return value
+
+
+def _validate_variables(definitions, values):
+    """Validate ``{variable_id: raw value}``; returns ``(clean values, errors)``."""
+    clean, errors = {}, []
+    for variable_id, value in values.items():
+        definition = definitions.get(variable_id)
+        if definition is None:
+            errors.append(f"Unknown variable {variable_id}")
+        elif value in (None, "", []):
+            continue
+        else:
+            try:
+                clean[variable_id] = _check_value(definition, value)
+            except ValueError as e:
+                errors.append(f"{definition['name']}: {e}")
+
+    for definition in definitions.values():
+        if definition["required"] and values.get(definition["id"]) in (None, "", []):
+            errors.append(f"{definition['name']} is required")
+    return clean, errors
+
+
+def _variable_rows(patient_id, values, user_id, now):
+    return [
+        {
+            "patient_id": patient_id,
+            "variable_id": variable_id,
+            "value": value,
+            "created_by": user_id,
+            "updated_by": user_id,
+            "timestamp_created": now,
+            "timestamp_updated": now,
+        }
+        for variable_id, value in values.items()
+    ]
+
+
+def _iter_lines(stream, chunk_size=64 * 1024):
+    """Yield decoded lines (newline included) from a byte stream without reading it all."""
+    pending = b""
+    first = True
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            text = line.decode("utf-8") + "\n"
+            if first:
+                text, first = text.lstrip("\ufeff"), False
+            yield text
+    if pending:
+        yield pending.decode("utf-8").lstrip("\ufeff") if first else pending.decode("utf-8")
+
+
+def _csv_records(lines, definitions):
+    by_name = {d["name"]: d["id"] for d in definitions.values()}
+    for record in csv.DictReader(lines):
+        patient = {k: record[k] for k in PATIENT_FIELDS if record.get(k) not in (None, "")}
+        values = {by_name[k]: v for k, v in record.items() if k in by_name}
+        values.update({k: v for k, v in record.items() if k not in by_name and k not in PATIENT_FIELDS})
+        yield patient, values
+
+
+def _ndjson_records(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            patient = {k: record[k] for k in PATIENT_FIELDS if record.get(k) is not None}
+            values = {int(v["variable_id"]): v.get("value") for v in record.get("study_variables", [])}
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            # A malformed line only spoils that line
+            yield ValueError(f"{type(e).__name__}: {e}")
+            continue
+        yield patient, values
+
+
+def _records(fmt, lines, definitions):
+    """Yield ``(patient fields, variable values)``, or an exception for an unreadable row."""
+    source = _csv_records(lines, definitions) if fmt == "csv" else _ndjson_records(lines)
+    try:
+        yield from source
+    except (ValueError, csv.Error) as e:
+        # Undecodable bytes or broken CSV quoting: nothing after this point can be trusted
+        yield e
+
+
+def _check_text(row):
+    """Errors for text fields that are not text or exceed their column's length."""
+    errors = []
+    for f, value in row.items():
+        column = Patient.__table__.c[f]
+        if value is None or not isinstance(column.type, (db.String, db.Text)):
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = row[f] = str(value)
+        if not isinstance(value, str):
+            errors.append(f"{f} must be text")
+        elif column.type.length and len(value) > column.type.length:
+            errors.append(f"{f} is longer than {column.type.length} characters")
+    return errors
+
+
+def _patient_row(fields, study_id, site_id, site_ids, user_id, now):
+    """Validate one patient and build its insert row, or raise ValueError.
+
+    Everything the database would reject is checked here, so a bad row is
+    reported on its own instead of failing the whole chunk.
+    """
+    missing = [f for f in REQUIRED_PATIENT_FIELDS if not fields.get(f)]
+    if missing:
+        raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+    row = dict(fields)
+    errors = _check_text(row)
+    for f in DATE_FIELDS:
+        if row.get(f):
+            try:
+                row[f] = date.fromisoformat(str(row[f]))
+            except ValueError:
+                errors.append(f"{f} is not a YYYY-MM-DD date")
+    if isinstance(row.get("is_active"), str):
+        row["is_active"] = row["is_active"].strip().lower() in ("1", "true", "yes")
+    row.setdefault("site_id", site_id)
+    if row["site_id"] is not None:
+        try:
+            row["site_id"] = int(row["site_id"])
+        except (TypeError, ValueError):
+            errors.append("site_id must be an integer")
+        else:
+            if row["site_id"] not in site_ids:
+                errors.append(f"Site {row['site_id']} is not linked to this study")
+    if errors:
+        raise ValueError("; ".join(errors))
+    row.update(
+        study_id=study_id, entered_by=user_id, updated_by=user_id,
+        timestamp_created=now, timestamp_updated=now
+    )
+    return row
+
+
+def _insert_chunk(chunk, user_id, now):
+    patient_ids = db.session.execute(
+        insert(Patient).returning(Patient.id, sort_by_parameter_order=True),
+        [patient for patient, _ in chunk]
+    ).scalars().all()
+    variable_rows = []
+    for patient_id, (_, values) in zip(patient_ids, chunk):
+        variable_rows.extend(_variable_rows(patient_id, values, user_id, now))
+    if variable_rows:
+        db.session.execute(PatientVariable.__table__.insert(), variable_rows)
+    db.session.commit()
+
+
+@patients_bp.route("/bulk", methods=["POST"])
+@jwt_required()
+def bulk_import_patients():
+    """Stream CSV or NDJSON patients into a study.
+
+    CSV: one column per patient field plus one per study variable (by name),
+    multiselect values separated by '|'. NDJSON: one create_patient-style
+    object per line. Rows are validated individually, patient fields against
+    their columns and the study's linked sites, and inserted in chunks of
+    BULK_CHUNK_SIZE, each chunk in its own transaction.
+    """
+    study_id = request.args.get("study_id", type=int)
+    site_id = request.args.get("site_id", type=int)
+    if not study_id:
+        return jsonify({"message": "study_id is required"}), 400
+
+    current_user = get_current_user()
+    if current_user.role != "admin" and study_id not in current_user.study_ids:
+        return jsonify({"message": "Access denied"}), 403
+
+    fmt = request.args.get("format")
+    if not fmt:
+        fmt = "csv" if request.mimetype in ("text/csv", "application/csv") else "ndjson"
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"message": f"Unsupported format: {fmt}"}), 400
+
+    config = get_study_config(study_id)
+    if not config:
+        return jsonify({"message": "Study not found"}), 404
+
+    user_id = current_user.id
+    now = datetime.utcnow()
+    definitions = _variable_definitions(config)
+    site_ids = frozenset(site.id for site in config.sites)
+    counts = {"received": 0, "inserted": 0, "failed": 0}
+    errors = []
+
+    def report(rows, message):
+        counts["failed"] += len(rows)
+        for row in rows:
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": row, "errors": message if isinstance(message, list) else [message]})
+
+    chunk, chunk_rows = [], []
+
+    def flush():
+        try:
+            _insert_chunk(chunk, user_id, now)
+            counts["inserted"] += len(chunk)
+        except Exception:
+            db.session.rollback()
+            # Something validation did not catch: retry row by row to find the culprit(s)
+            for item, row_number in zip(chunk, chunk_rows):
+                try:
+                    _insert_chunk([item], user_id, now)
+                    counts["inserted"] += 1
+                except Exception as e:
+                    db.session.rollback()
+                    report([row_number], f"Database error: {e}")
+        chunk.clear()
+        chunk_rows.clear()
+
+    for row_number, record in enumerate(_records(fmt, _iter_lines(request.stream), definitions), start=1):
+        counts["received"] += 1
+        if isinstance(record, Exception):
+            report([row_number], f"Unreadable row: {record}")
+            continue
+
+        fields, raw_values = record
+        values, row_errors = _validate_variables(definitions, raw_values)
+        try:
+            patient = _patient_row(fields, study_id, site_id, site_ids, user_id, now)
+        except ValueError as e:
+            row_errors.insert(0, str(e))
+        if row_errors:
+            report([row_number], row_errors)
+            continue
+
+        chunk.append((patient, values))
+        chunk_rows.append(row_number)
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            flush()
+
+    if chunk:
+        flush()
+
+    return jsonify({
+        **counts,
+        "errors": errors,
+        "errors_truncated": counts["failed"] > len(errors)
+    }), 201 if counts["inserted"] else 400
@@ -1,12 +1,102 @@
 # routes/randomization.py
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import insert, select
 from models import db, Study, TreatmentArm, Randomization
+from study_config import get_study_config
+from auth import get_current_user
+from randomization_engine import (
+    draw, pregenerate, minimize, cluster_arm_id, parse_factors, factor_levels, make_stratum_key, all_strata, AllocationError
+)
 from datetime import datetime
 import random, json
 
 randomization_bp = Blueprint("randomization", __name__, url_prefix="/api")
 
+# Upper bounds for one /generate request, which runs in a single transaction
+MAX_SLOTS_PER_STRATUM = 10000
+MAX_GENERATED_SLOTS = 100000
+
+def _allocate(study, arms, entries):
+    """Allocate an arm to each entry (patient_id, site_id, stratification_values), in order.
+
+    Returns ``[(arm, allocation_position, stratum_key)]``. Block and stratified
+    entries reserve their slots with one draw per stratum, so a batch takes a
+    contiguous run of each allocation list in request order.
+    """
+    arms_by_id = {arm.id: arm for arm in arms}
+    kind = study.randomization_type
+    results = [None] * len(entries)
+
+    if kind == 'simple':
+        # Simple randomization (equal probability)
+        return [(random.choice(arms), None, None) for _ in entries]
+
+    if kind in ('block', 'stratified', 'minimization'):
+        factors = parse_factors(study.stratification_factors) if kind != 'block' else []
+        levels = []
+        for entry in entries:
+            try:
+                levels.append(factor_levels(factors, entry.get('stratification_values') or {}))
+            except AllocationError as e:
+                prefix = f"Patient {entry.get('patient_id')}: " if len(entries) > 1 else ""
+                raise AllocationError(f"{prefix}{e}")
+
+        if kind == 'minimization':
+            # Pocock–Simon minimization over the stratification factors; each
+            # allocation depends on the previous one, so this stays sequential
+            return [(minimize(study, arms, patient_levels), None, None) for patient_levels in levels]
+
+        # Permuted blocks, one allocation list per stratum (a single '' stratum for block)
+        by_stratum = {}
+        for i, patient_levels in enumerate(levels):
+            by_stratum.setdefault(make_stratum_key(patient_levels), []).append(i)
+        for stratum, indexes in by_stratum.items():
+            for i, (position, arm_id) in zip(indexes, draw(study, arms, stratum, count=len(indexes))):
+                results[i] = (arms_by_id[arm_id], position, stratum or None)
+        return results
+
+    if kind == 'cluster':
+        # Cluster randomization by site_id
+        for i, entry in enumerate(entries):
+            if not entry.get('site_id'):
+                raise AllocationError("Site ID required for cluster randomization")
+            results[i] = (arms_by_id[cluster_arm_id(study, arms, entry['site_id'])], None, None)
+        return results
+
+    raise AllocationError(f"Unsupported randomization type: {kind}")
+
+
+def _load_study(study_id):
+    # Cached, immutable snapshot: no study/arm queries on the hot path
+    study = get_study_config(study_id)
+    if not study or not study.is_randomized:
+        raise AllocationError("Study not found or not randomized")
+    if not study.arms:
+        raise AllocationError("No treatment arms defined")
+    return study, list(study.arms)
+
+
+def _save(study, entries, allocations, user_id):
+    now = datetime.utcnow()
+    db.session.execute(insert(Randomization), [
+        {
+            "study_id": study.id,
+            "patient_id": entry['patient_id'],
+            "site_id": entry.get('site_id'),
+            "treatment_arm": arm.name,
+            "treatment_arm_id": arm.id,
+            "allocation_position": position,
+            "stratum_key": stratum,
+            "stratification_factors": json.dumps(entry.get('stratification_values') or {}),
+            "randomization_date": now,
+            "entered_by": user_id,
+        }
+        for entry, (arm, position, stratum) in zip(entries, allocations)
+    ])
+    db.session.commit()
+
+
 @randomization_bp.route('/randomize', methods=['POST'])
 @jwt_required()
 def randomize_patient():
@@ -14,78 +104,122 @@ def randomize_patient():
         data = request.get_json()
         user_id = get_jwt_identity()
 
-        study_id = data['study_id']
-        patient_id = data['patient_id']
-        site_id = data.get('site_id')
-        stratification_values = data.get('stratification_values', {})
-
-        study = Study.query.get(study_id)
-        if not study or not study.is_randomized:
-            return jsonify({"message": "Study not found or not randomized"}), 400
+        study, arms = _load_study(data['study_id'])
 
-        arms = TreatmentArm.query.filter_by(study_id=study_id).all()
-        if not arms:
-            return jsonify({"message": "No treatment arms defined"}), 400
+        if Randomization.query.filter_by(patient_id=data['patient_id']).first():
+            return jsonify({"message": "Patient already randomized"}), 400
 
-        # --- RANDOMIZATION STRATEGIES ---
-        selected_arm = None
-
-        if study.randomization_type == 'simple':
-            # Simple randomization (equal probability)
-            selected_arm = random.choice(arms)
-
-        elif study.randomization_type == 'block':
-            # Block randomization using allocation ratios
-            weighted_arms = []
-            for arm in arms:
-                weighted_arms.extend([arm] * arm.allocation_ratio)
-            random.shuffle(weighted_arms)
-            # Optional: future enhancement to manage block state
-            selected_arm = weighted_arms[0]
-
-        elif study.randomization_type == 'stratified':
-            # Placeholder: stratified randomization based on values
-            # Future: Group patients by stratification variables
-            weighted_arms = []
-            for arm in arms:
-                weighted_arms.extend([arm] * arm.allocation_ratio)
-            selected_arm = random.choice(weighted_arms)
-
-        elif study.randomization_type == 'cluster':
-            # Cluster randomization by site_id
-            if not site_id:
-                return jsonify({"message": "Site ID required for cluster randomization"}), 400
-            assigned_arm = Randomization.query.filter_by(site_id=site_id).first()
-            if assigned_arm:
-                selected_arm_name = assigned_arm.treatment_arm
-                selected_arm = next((a for a in arms if a.name == selected_arm_name), None)
-            else:
-                selected_arm = random.choice(arms)
-
-        else:
-            return jsonify({"message": f"Unsupported randomization type: {study.randomization_type}"}), 400
-
-        if not selected_arm:
-            return jsonify({"message": "Unable to assign treatment arm"}), 500
-
-        # Save result
-        new_randomization = Randomization(
-            patient_id=patient_id,
-            treatment_arm=selected_arm.name,
-            randomization_date=datetime.utcnow(),
-            stratification_factors=json.dumps(stratification_values),
-            entered_by=user_id,
-            site_id=site_id
-        )
-        db.session.add(new_randomization)
-        db.session.commit()
+        [(selected_arm, _, _)] = allocations = _allocate(study, arms, [data])
+        _save(study, [data], allocations, user_id)
 
         return jsonify({
             "assigned_arm": selected_arm.name,
             "treatment_arm_id": selected_arm.id
         }), 201
 
+    except AllocationError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         import traceback
         print("🔥 Randomization Error:\n", traceback.format_exc())
         return jsonify({"error": str(e)}), 500
+
+
+@randomization_bp.route('/randomize/batch', methods=['POST'])
+@jwt_required()
+def randomize_batch():
+    """Randomize a list of patients of one study in a single transaction.
+
+    Body: {"study_id": ..., "patients": [{"patient_id", "site_id", "stratification_values"}, ...]}.
+    Either every patient is allocated or none is.
+    """
+    try:
+        data = request.get_json()
+        user_id = get_jwt_identity()
+        entries = data.get('patients') or []
+        if not entries:
+            return jsonify({"message": "No patients given"}), 400
+
+        patient_ids = [entry.get('patient_id') for entry in entries]
+        if None in patient_ids:
+            return jsonify({"message": "Every patient needs a patient_id"}), 400
+        if len(set(patient_ids)) != len(patient_ids):
+            return jsonify({"message": "Duplicate patient_id in batch"}), 400
+
+        study, arms = _load_study(data['study_id'])
+
+        already = db.session.execute(
+            select(Randomization.patient_id).where(Randomization.patient_id.in_(patient_ids))
+        ).scalars().all()
+        if already:
+            return jsonify({"message": "Patients already randomized", "patient_ids": sorted(already)}), 400
+
+        allocations = _allocate(study, arms, entries)
+        _save(study, entries, allocations, user_id)
+
+        return jsonify({
+            "assignments": [
+                {"patient_id": entry['patient_id'], "assigned_arm": arm.name, "treatment_arm_id": arm.id}
+                for entry, (arm, _, _) in zip(entries, allocations)
+            ]
+        }), 201
+
+    except AllocationError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        import traceback
+        print("🔥 Batch Randomization Error:\n", traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@randomization_bp.route('/randomize/<int:study_id>/generate', methods=['POST'])
+@jwt_required()
+def generate_allocation_lists(study_id):
+    """Pre-generate the allocation list of every stratum, e.g. when the study is locked."""
+    try:
+        current_user = get_current_user()
+        study = get_study_config(study_id)
+        if not study:
+            return jsonify({"message": "Study not found"}), 404
+        if current_user.role != 'admin' and study.created_by != current_user.id:
+            return jsonify({"message": "Access denied"}), 403
+        if study.randomization_type not in ('block', 'stratified'):
+            return jsonify({"message": "Allocation lists apply to block and stratified randomization only"}), 400
+
+        arms = list(study.arms)
+        if not arms:
+            return jsonify({"message": "No treatment arms defined"}), 400
+
+        data = request.get_json(silent=True) or {}
+        raw = data.get('slots_per_stratum', 100)
+        try:
+            slots = None if isinstance(raw, (bool, float)) else int(raw)
+        except (TypeError, ValueError):
+            slots = None
+        if slots is None or not 1 <= slots <= MAX_SLOTS_PER_STRATUM:
+            return jsonify({
+                "message": f"slots_per_stratum must be an integer between 1 and {MAX_SLOTS_PER_STRATUM}"
+            }), 400
+
+        strata = ['']
+        if study.randomization_type == 'stratified':
+            strata = all_strata(parse_factors(study.stratification_factors))
+            if strata is None:
+                return jsonify({"message": "Every stratification factor needs declared levels"}), 400
+        if len(strata) * slots > MAX_GENERATED_SLOTS:
+            return jsonify({
+                "message": f"{len(strata)} strata x {slots} slots exceeds {MAX_GENERATED_SLOTS} slots per request"
+            }), 400
+
+        for stratum in strata:
+            pregenerate(study, arms, stratum, slots)
+        db.session.commit()
+
+        return jsonify({"strata": len(strata), "slots_per_stratum": slots}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
@@ -1,23 +1,32 @@
 # routes/sites.py
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select, func
 from datetime import datetime
-from models import db, Users, Site, StudySite
+from models import db, Site, StudySite, TableVersion, bump_table_version
+from pagination import keyset_page, cursor_requested, page_args, InvalidCursor
+from auth import roles_required
+from study_config import bump_config_version
+from http_cache import conditional
+from serializers import SITE
 
 sites_bp = Blueprint('sites', __name__, url_prefix='/api/sites')
 
+
+def _sites_version():
+    # Every site write bumps the counter; max(id) would not do, SQLite reuses the rowid of a deleted max row
+    row = db.session.execute(select(
+        select(TableVersion.version).where(TableVersion.name == Site.__tablename__).scalar_subquery(),
+        select(func.count(Site.id)).scalar_subquery(),
+        select(func.max(Site.timestamp_updated)).scalar_subquery(),
+    )).one()
+    return tuple(row), row[2]
+
+
 @sites_bp.route('', methods=['GET', 'POST'])
-@jwt_required()
+@roles_required("admin")
+@conditional(_sites_version)
 def handle_sites():
     try:
-        user_id = get_jwt_identity()
-        current_user = Users.query.get(user_id)
-
-        if not current_user:
-            return jsonify({"message": "User not found"}), 404
-        if current_user.role != "admin":
-            return jsonify({"message": "Access denied"}), 403
-
         if request.method == "POST":
             data = request.get_json()
             if not data.get("name") or not data.get("location"):
@@ -31,38 +40,32 @@ def handle_sites():
                 timestamp_created=datetime.utcnow()
             )
             db.session.add(site)
+            bump_table_version(Site.__tablename__)
             db.session.commit()
             return jsonify({"message": "Site created"}), 201
 
-        sites = Site.query.all()
-        return jsonify([
-            {
-                "id": s.id,
-                "name": s.name,
-                "location": s.location,
-                "created": s.timestamp_created.isoformat() if s.timestamp_created else None,
-                "updated": s.timestamp_updated.isoformat() if s.timestamp_updated else None
-            }
-            for s in sites
-        ])
+        query = db.session.query(*SITE.columns(Site))
+        if cursor_requested():
+            sites, next_cursor = keyset_page(query, [Site.id], *page_args())
+        else:
+            sites = query.all()
+
+        result = SITE.many(sites)
+        if cursor_requested():
+            return jsonify({"sites": result, "next_cursor": next_cursor})
+        return jsonify(result)
 
+    except InvalidCursor:
+        return jsonify({"message": "Invalid cursor"}), 400
     except Exception as e:
         print("❌ /api/sites ERROR:", e)
         return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
 
 
 @sites_bp.route('/<int:site_id>', methods=['PUT', 'DELETE'])
-@jwt_required()
+@roles_required("admin")
 def modify_site(site_id):
     try:
-        user_id = get_jwt_identity()
-        current_user = Users.query.get(user_id)
-
-        if not current_user:
-            return jsonify({"message": "User not found"}), 404
-        if current_user.role != "admin":
-            return jsonify({"message": "Access denied"}), 403
-
         site = Site.query.get(site_id)
         if not site:
             return jsonify({"message": "Site not found"}), 404
@@ -71,6 +74,9 @@ def modify_site(site_id):
             data = request.get_json()
             site.name = data.get("name", site.name)
             site.location = data.get("location", site.location)
+            # Site names are part of every linked study's cached config
+            bump_config_version(*[ss.study_id for ss in StudySite.query.filter_by(site_id=site_id)])
+            bump_table_version(Site.__tablename__)
             db.session.commit()
             return jsonify({"message": "Site updated"}), 200
 
@@ -78,6 +84,7 @@ def modify_site(site_id):
             return jsonify({"message": "Cannot delete: Site linked to study"}), 400
 
         db.session.delete(site)
+        bump_table_version(Site.__tablename__)
         db.session.commit()
         return jsonify({"message": "Site deleted"}), 200
 
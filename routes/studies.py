@@ -1,22 +1,58 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Study, StudySite, Users, StudyUser, TreatmentArm, StudyVariable
+from models import db, Study, StudySite, StudyUser, TreatmentArm, StudyVariable, Users, MinimizationCount, insert_ignore
+from sqlalchemy import select, func, update
+from sqlalchemy.orm import selectinload
+from search import search_studies
+from randomization_engine import discard_unused_slots, arm_in_use
+from study_config import get_study_config, get_study_configs, bump_config_version, config_version
+from http_cache import conditional
+from serializers import STUDY, ASSIGNED_STUDY, ARM, VARIABLE, SITE_BRIEF
+from export import export_study, FORMATS as EXPORT_FORMATS
+from pagination import keyset_page, cursor_requested, InvalidCursor
+from auth import get_current_user, invalidate_user, bump_token_version
 from datetime import datetime
-from dateutil.parser import parse
 from datetime import date
 
 studies_bp = Blueprint("studies", __name__, url_prefix="/api/studies")
 
+
+def _studies_version():
+    # Site links and site edits bump config_version, membership changes members_version
+    # (ids would not do: SQLite reuses the rowid of a deleted max row); member edits move users.timestamp_updated
+    row = db.session.execute(select(*[
+        select(aggregate).scalar_subquery() for aggregate in (
+            func.count(Study.id), func.max(Study.timestamp_updated), func.sum(Study.config_version),
+            func.sum(Study.members_version), func.max(Users.timestamp_updated),
+        )
+    ])).one()
+    return tuple(row), row[1]
+
+
+def _bump_members_version(study_id):
+    db.session.execute(
+        update(Study).where(Study.id == study_id)
+        .values(members_version=Study.members_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _study_config_version(study_id):
+    return config_version(study_id), None
+
+
 @studies_bp.route('', methods=['GET', 'POST'])
 @jwt_required()
+@conditional(_studies_version)
 def handle_studies():
     user_id = get_jwt_identity()
-    current_user = Users.query.get(user_id)
+    current_user = get_current_user()
 
     if request.method == 'POST':
         if current_user.role not in ['admin', 'studymanager']:
             return jsonify({"message": "Permission denied"}), 403
         try:
+            from dateutil.parser import parse  # deferred: only writes need it, and it slows worker boot
             data = request.get_json()
             end_date_str = data.get('end_date')
             end_date = parse(end_date_str).date() if end_date_str else None
@@ -45,50 +81,38 @@ def handle_studies():
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 10, type=int)
 
-        query = Study.query
+        # One query each for the page, its sites and its users instead of one per study
+        query = Study.query.options(
+            selectinload(Study.study_sites).joinedload(StudySite.site),
+            selectinload(Study.users)
+        )
 
         if current_user.role == 'studymanager':
             query = query.filter(Study.created_by == user_id)
 
+        rank = None
         if search:
-            query = query.filter(Study.name.ilike(f"%{search}%"))
-
-        studies = query.order_by(Study.timestamp_created.desc()).paginate(page=page, per_page=limit, error_out=False)
-
-        result = []
-        for s in studies.items:
-            result.append({
-                "id": s.id,
-                "name": s.name,
-                "protocol_number": s.protocol_number,
-                "irb_number": s.irb_number,
-                "start_date": s.start_date.isoformat() if s.start_date else None,
-                "end_date": s.end_date.isoformat() if s.end_date else None,
-                "created_by": s.created_by,
-                "updated_by": s.updated_by,
-                "is_randomized": s.is_randomized,
-                "randomization_type": s.randomization_type,
-                "block_size": s.block_size,
-                "stratification_factors": s.stratification_factors,
-                "sites": [
-                    {
-                        "id": ss.site.id,
-                        "name": ss.site.name,
-                        "location": ss.site.location
-                    } for ss in s.study_sites
-                ],
-                "users": [
-                    {
-                        "id": u.id,
-                        "username": u.username,
-                        "first_name": u.first_name,
-                        "last_name": u.last_name,
-                        "title": u.title,
-                        "role": u.role
-                    } for u in s.users
-                ]
-            })
+            query, rank = search_studies(query, search)
+
+        if cursor_requested():
+            # Keyset mode: no OFFSET scan and no COUNT(*) unless asked for
+            items, next_cursor = keyset_page(
+                query, [Study.timestamp_created, Study.id], request.args.get('cursor', ''), limit
+            )
+        else:
+            order = [Study.timestamp_created.desc()]
+            if rank is not None:
+                order.insert(0, rank.desc())
+            studies = query.order_by(*order).paginate(page=page, per_page=limit, error_out=False)
+            items = studies.items
+
+        result = STUDY.many(items)
 
+        if cursor_requested():
+            body = {"studies": result, "next_cursor": next_cursor}
+            if request.args.get('include_total') in ('1', 'true'):
+                body["total"] = query.order_by(None).count()
+            return jsonify(body), 200
 
         return jsonify({
             "studies": result,
@@ -96,6 +120,8 @@ def handle_studies():
             "pages": studies.pages,
             "page": studies.page
         }), 200
+    except InvalidCursor:
+        return jsonify({"message": "Invalid cursor"}), 400
     except Exception as e:
         return jsonify({"message": "Error retrieving studies", "error": str(e)}), 500
 
@@ -104,7 +130,7 @@ def handle_studies():
 @jwt_required()
 def update_study(study_id):
     user_id = get_jwt_identity()
-    current_user = Users.query.get(user_id)
+    current_user = get_current_user()
 
     study = Study.query.get(study_id)
     if not study:
@@ -114,6 +140,7 @@ def update_study(study_id):
         return jsonify({"message": "Access denied"}), 403
 
     try:
+        from dateutil.parser import parse  # deferred: only writes need it, and it slows worker boot
         data = request.get_json()
         end_date_str = data.get('end_date')
         start_date_str = data.get('start_date')
@@ -132,14 +159,15 @@ def update_study(study_id):
         if 'randomization_type' in data:
             study.randomization_type = data['randomization_type'] or None
         
-        if 'block_size' in data:
+        if 'block_size' in data and (data['block_size'] or None) != study.block_size:
             study.block_size = data['block_size'] or None
+            discard_unused_slots(study.id)
         
         if 'stratification_factors' in data:
             study.stratification_factors = data['stratification_factors'] or None
 
         
-                
+        bump_config_version(study.id)
         db.session.commit()
         return jsonify({"message": "Study updated"}), 200
     except Exception as e:
@@ -150,7 +178,7 @@ def update_study(study_id):
 @jwt_required()
 def assign_study_site():
     user_id = get_jwt_identity()
-    current_user = Users.query.get(user_id)
+    current_user = get_current_user()
     data = request.get_json()
 
     study = Study.query.get(data['study_id'])
@@ -160,18 +188,18 @@ def assign_study_site():
     if current_user.role != 'admin' and study.created_by != user_id:
         return jsonify({"message": "Access denied"}), 403
 
-    existing = StudySite.query.filter_by(study_id=data['study_id'], site_id=data['site_id']).first()
-    if existing:
-        return jsonify({"message": "Site already assigned"}), 400
-
-    assignment = StudySite(
+    now = datetime.utcnow()
+    if not insert_ignore(
+        StudySite,
         study_id=data['study_id'],
         site_id=data['site_id'],
         created_by=user_id,
-        timestamp_created=datetime.utcnow(),
-        timestamp_updated=datetime.utcnow()
-    )
-    db.session.add(assignment)
+        timestamp_created=now,
+        timestamp_updated=now
+    ):
+        return jsonify({"message": "Site already assigned"}), 400
+
+    bump_config_version(data['study_id'])
     db.session.commit()
     return jsonify({"message": "Site assigned to study"}), 201
 
@@ -179,7 +207,7 @@ def assign_study_site():
 @jwt_required()
 def unassign_study_site():
     user_id = get_jwt_identity()
-    current_user = Users.query.get(user_id)
+    current_user = get_current_user()
     data = request.get_json()
 
     study = Study.query.get(data['study_id'])
@@ -194,6 +222,7 @@ def unassign_study_site():
         return jsonify({"message": "Site not assigned to study"}), 404
 
     db.session.delete(study_site)
+    bump_config_version(data['study_id'])
     db.session.commit()
 
     return jsonify({"message": "Site unassigned from study"}), 200
@@ -206,17 +235,13 @@ def assign_user_to_study():
     study_id = data.get('study_id')
     target_user_id = data.get('user_id')
 
-    existing = StudyUser.query.filter_by(study_id=study_id, user_id=target_user_id).first()
-    if existing:
+    if not insert_ignore(StudyUser, study_id=study_id, user_id=target_user_id, created_by=user_id):
         return jsonify({"message": "User already assigned"}), 400
 
-    link = StudyUser(
-        study_id=study_id,
-        user_id=target_user_id,
-        created_by=user_id
-    )
-    db.session.add(link)
+    bump_token_version(target_user_id)
+    _bump_members_version(study_id)
     db.session.commit()
+    invalidate_user(target_user_id)
     return jsonify({"message": "User assigned to study"}), 201
 
 @studies_bp.route('/unassign-user', methods=['POST'])
@@ -231,7 +256,10 @@ def unassign_user_from_study():
         return jsonify({"error": "User is not assigned to this study"}), 404
 
     db.session.delete(link)
+    bump_token_version(target_user_id)
+    _bump_members_version(study_id)
     db.session.commit()
+    invalidate_user(target_user_id)
     return jsonify({"message": "User unassigned from study"}), 200
 
 @studies_bp.route('/assigned-studies', methods=['GET'])
@@ -242,32 +270,24 @@ def get_assigned_studies():
         today = date.today()
 
         user_id = get_jwt_identity()
-        user = Users.query.get(user_id)
+        user = get_current_user()
 
-        if user.role == 'admin':
-            query = Study.query
-        else:
-            query = Study.query.join(StudyUser).filter(StudyUser.user_id == user_id)
+        # Rows of four columns; Study.query would also join-load every study's sites
+        query = db.session.query(*ASSIGNED_STUDY.columns(Study))
+        if user.role != 'admin':
+            query = query.join(StudyUser, StudyUser.study_id == Study.id).filter(StudyUser.user_id == user_id)
 
         query = query.filter((Study.end_date == None) | (Study.end_date >= today))
 
         studies = query.all()
+        # Sites come from the cached study configs rather than a join per request
+        configs = get_study_configs([s.id for s in studies])
 
         results = []
         for s in studies:
-            results.append({
-                "id": s.id,
-                "name": s.name,
-                "protocol_number": s.protocol_number,
-                "end_date": s.end_date.isoformat() if s.end_date else None,
-                "sites": [
-                    {
-                        "id": ss.site.id,
-                        "name": ss.site.name
-                    }
-                    for ss in s.study_sites
-                ]
-            })
+            study = ASSIGNED_STUDY.one(s)
+            study["sites"] = SITE_BRIEF.many(configs[s.id].sites)
+            results.append(study)
 
         return jsonify(results), 200
     except Exception as e:
@@ -290,28 +310,21 @@ def add_treatment_arm(study_id):
         timestamp_created=datetime.utcnow()
     )
     db.session.add(arm)
+    discard_unused_slots(study_id)
+    bump_config_version(study_id)
     db.session.commit()
     return jsonify({"message": "Treatment arm added"}), 201
 
 
 @studies_bp.route('/<int:study_id>/get-arms', methods=['GET'])
 @jwt_required()
+@conditional(_study_config_version)
 def get_treatment_arms(study_id):
-    study = Study.query.get(study_id)
-    if not study:
+    config = get_study_config(study_id)
+    if not config:
         return jsonify({"message": "Study not found"}), 404
 
-    arms = [
-        {
-            "id": arm.id,
-            "name": arm.name,
-            "description": arm.description,
-            "allocation_ratio": arm.allocation_ratio
-        }
-        for arm in study.treatment_arms
-    ]
-
-    return jsonify(arms), 200
+    return jsonify(ARM.many(config.arms)), 200
 
 @studies_bp.route('/arms/<int:arm_id>', methods=['DELETE'])
 @jwt_required()
@@ -322,13 +335,24 @@ def delete_treatment_arm(arm_id):
     if not arm:
         return jsonify({"message": "Treatment arm not found"}), 404
 
-    current_user = Users.query.get(user_id)
+    current_user = get_current_user()
     if current_user.role != 'admin' and arm.created_by != user_id:
         return jsonify({"message": "Access denied"}), 403
 
-    db.session.delete(arm)
-    db.session.commit()
-    return jsonify({"message": "Treatment arm deleted"}), 200
+    try:
+        discard_unused_slots(arm.study_id)
+        if arm_in_use(arm.id):
+            db.session.rollback()
+            return jsonify({"message": "Treatment arm has allocations and cannot be deleted"}), 400
+        # Only all-zero minimization counts are left
+        MinimizationCount.query.filter_by(treatment_arm_id=arm.id).delete(synchronize_session=False)
+        bump_config_version(arm.study_id)
+        db.session.delete(arm)
+        db.session.commit()
+        return jsonify({"message": "Treatment arm deleted"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": "Delete failed", "error": str(e)}), 500
 
 @studies_bp.route("/<int:study_id>/variables", methods=["POST"])
 @jwt_required()
@@ -348,24 +372,17 @@ def add_study_variable(study_id):
         updated_by=user_id
     )
     db.session.add(variable)
+    bump_config_version(study_id)
     db.session.commit()
     return jsonify({"message": "Variable added", "id": variable.id}), 201
 
 @studies_bp.route("/<int:study_id>/variables", methods=["GET"])
 @jwt_required()
+@conditional(_study_config_version)
 def get_study_variables(study_id):
-    variables = StudyVariable.query.filter_by(study_id=study_id).all()
-    return jsonify([
-        {
-            "id": v.id,
-            "name": v.name,
-            "description": v.description,
-            "variable_type": v.variable_type,
-            "required": v.required,
-            "options": v.options
-            "entry_stage": v.entry_stage  # ✅ NEW
-        } for v in variables
-    ])
+    config = get_study_config(study_id)
+    variables = config.variables if config else ()
+    return jsonify(VARIABLE.many(variables))
 
 @studies_bp.route("/variables/<int:var_id>", methods=["PUT"])
 @jwt_required()
@@ -379,6 +396,7 @@ def update_study_variable(var_id):
     variable.options = data.get("options", variable.options)
     variable.entry_stage = data.get("entry_stage", variable.entry_stage)  # ✅ NEW
     variable.updated_by = get_jwt_identity()
+    bump_config_version(variable.study_id)
     db.session.commit()
     return jsonify({"message": "Variable updated"})
 
@@ -386,7 +404,34 @@ def update_study_variable(var_id):
 @jwt_required()
 def delete_study_variable(var_id):
     variable = StudyVariable.query.get_or_404(var_id)
+    bump_config_version(variable.study_id)
     db.session.delete(variable)
     db.session.commit()
     return jsonify({"message": "Variable deleted"})
 
+
+@studies_bp.route("/<int:study_id>/export", methods=["GET"])
+@jwt_required()
+def export_study_data(study_id):
+    current_user = get_current_user()
+    study = Study.query.get(study_id)
+    if not study:
+        return jsonify({"message": "Study not found"}), 404
+    if current_user.role != 'admin' and study.created_by != current_user.id and study_id not in current_user.study_ids:
+        return jsonify({"message": "Access denied"}), 403
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"message": f"Unsupported format: {fmt}"}), 400
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return jsonify({"message": "Parquet export is not available on this server"}), 400
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(
+        stream_with_context(export_study(study_id, fmt)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=study_{study_id}.{extension}"}
+    )
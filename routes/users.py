@@ -1,40 +1,46 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash
 from models import db, Users  # ✅ clean and modular
+from pagination import keyset_page, cursor_requested, page_args, InvalidCursor
+from auth import roles_required, auth_cache_stats, invalidate_user, bump_token_version
+from cache import cache_stats
+from serializers import USER
+from passwords import hash_password
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
 # GET: List all users (admin only)
 @users_bp.route('/', methods=['GET'])
-@jwt_required()
+@roles_required("admin")
 def get_users():
-    current_user = Users.query.get(get_jwt_identity())
-    if current_user.role != "admin":
-        return jsonify({"message": "Access denied"}), 403
-
-    users = Users.query.all()
-    return jsonify([
-        {
-            "id": user.id,
-            "username": user.username,
-            "role": user.role,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "title": user.title
-        } for user in users
-    ]), 200
+    next_cursor = None
+    # Plain rows of the six public columns: no ORM objects, never the password hash
+    query = db.session.query(*USER.columns(Users))
+    if cursor_requested():
+        try:
+            users, next_cursor = keyset_page(query, [Users.id], *page_args())
+        except InvalidCursor:
+            return jsonify({"message": "Invalid cursor"}), 400
+    else:
+        users = query.all()
+
+    result = USER.many(users)
+    if cursor_requested():
+        return jsonify({"users": result, "next_cursor": next_cursor}), 200
+    return jsonify(result), 200
+
+# GET: Auth cache hit/miss counters and cache backend state (admin only)
+@users_bp.route('/auth-cache', methods=['GET'])
+@roles_required("admin")
+def get_auth_cache_stats():
+    return jsonify({**auth_cache_stats(), "backend": cache_stats()}), 200
 
 # POST: Create user (admin only)
 @users_bp.route('/', methods=['POST'])
-@jwt_required()
+@roles_required("admin")
 def create_user():
-    current_user = Users.query.get(get_jwt_identity())
-    if current_user.role != "admin":
-        return jsonify({"message": "Access denied"}), 403
-
     data = request.get_json()
-    hashed_pw = generate_password_hash(data["password"])
+    hashed_pw = hash_password(data["password"])
     new_user = Users(
         username=data["username"],
         password=hashed_pw,
@@ -46,12 +52,8 @@ def create_user():
 
 # POST: Reset password
 @users_bp.route('/<int:user_id>/reset-password', methods=['POST'])
-@jwt_required()
+@roles_required("admin")
 def reset_password(user_id):
-    current_user = Users.query.get(get_jwt_identity())
-    if current_user.role != "admin":
-        return jsonify({"message": "Access denied"}), 403
-
     data = request.get_json()
     new_password = data.get('password')
     if not new_password:
@@ -61,18 +63,16 @@ def reset_password(user_id):
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    user.password = generate_password_hash(new_password)
+    user.password = hash_password(new_password)
+    bump_token_version(user.id)
     db.session.commit()
+    invalidate_user(user.id)
     return jsonify({"message": "Password updated"}), 200
 
 # POST: Update user role
 @users_bp.route('/<int:user_id>/update-role', methods=['POST'])
-@jwt_required()
+@roles_required("admin")
 def update_role(user_id):
-    current_user = Users.query.get(get_jwt_identity())
-    if current_user.role != "admin":
-        return jsonify({"message": "Access denied"}), 403
-
     data = request.get_json()
     new_role = data.get('role')
     if not new_role:
@@ -83,7 +83,9 @@ def update_role(user_id):
         return jsonify({"message": "User not found"}), 404
 
     user.role = new_role
+    bump_token_version(user.id)
     db.session.commit()
+    invalidate_user(user.id)
     return jsonify({"message": "Role updated"}), 200
 
 # routes/users.py or wherever user routes are handled
@@ -127,12 +129,5 @@ def get_user_by_id(user_id):
     if not user:
         return jsonify({'message': 'User not found'}), 404
 
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'role': user.role,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'title': user.title
-    }), 200
+    return jsonify(USER.one(user)), 200
 
@@ -0,0 +1,101 @@
+# search.py
+"""Study search backends.
+
+PostgreSQL uses pg_trgm GIN indexes, SQLite an FTS5 trigram table (see the
+study search migration). Both keep the substring semantics of the original
+ILIKE filter and add a relevance score; any other database, or one where the
+search index has not been created, falls back to plain ILIKE. Setting
+STUDY_SEARCH=ilike forces the fallback, e.g. to compare the two (see
+``benchmark.py --search-scale``).
+"""
+import os
+import time
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+from flask import current_app
+from sqlalchemy import Column, Integer, MetaData, Table, func, literal_column, or_, text
+from models import db, Study
+
+SEARCH_COLUMNS = (Study.name, Study.protocol_number, Study.irb_number)
+# Trigram indexes cannot help with shorter terms
+MIN_INDEXED_LENGTH = 3
+# How long a "study_fts exists" answer is trusted before sqlite_master is asked again
+FTS_RECHECK_SECONDS = int(os.environ.get("FTS_RECHECK_SECONDS", 60))
+
+_study_fts = Table("study_fts", MetaData(), Column("rowid", Integer))
+_fts_checked = WeakKeyDictionary()  # engine -> (available, monotonic time of the check)
+_fts_lock = Lock()
+
+
+def _like_pattern(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _ilike_filter(term):
+    pattern = _like_pattern(term)
+    return or_(*[col.ilike(pattern, escape="\\") for col in SEARCH_COLUMNS])
+
+
+def _search_ilike(query, term):
+    return query.filter(_ilike_filter(term)), None
+
+
+def _search_postgresql(query, term):
+    # ILIKE is served by the gin_trgm_ops indexes; similarity() ranks the hits
+    rank = func.greatest(*[func.similarity(func.coalesce(col, ""), term) for col in SEARCH_COLUMNS])
+    return query.filter(_ilike_filter(term)), rank
+
+
+def _fts_available(engine):
+    # Per engine instance, not URL: every app (and test) gets its own answer
+    with _fts_lock:
+        available, checked = _fts_checked.get(engine, (None, 0.0))
+    if available is None or time.monotonic() - checked > FTS_RECHECK_SECONDS:
+        with engine.connect() as conn:
+            available = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'study_fts'")
+            ).first() is not None
+        with _fts_lock:
+            _fts_checked[engine] = (available, time.monotonic())
+    return available
+
+
+def forget_search_indexes(engine):
+    """Re-detect the search index of ``engine`` on next use, e.g. after migrations."""
+    with _fts_lock:
+        _fts_checked.pop(engine, None)
+
+
+def _search_sqlite(query, term):
+    if not _fts_available(db.engine):
+        return _search_ilike(query, term)
+
+    phrase = '"' + term.replace('"', '""') + '"'
+    query = (
+        query.join(_study_fts, _study_fts.c.rowid == Study.id)
+        .filter(text("study_fts MATCH :study_search"))
+        .params(study_search=phrase)
+    )
+    # bm25() is lower-is-better
+    return query, -literal_column("bm25(study_fts)")
+
+
+_BACKENDS = {
+    "postgresql": _search_postgresql,
+    "sqlite": _search_sqlite,
+}
+
+
+def search_studies(query, term):
+    """Filter a Study query by ``term``; returns ``(query, rank)``.
+
+    ``rank`` is a SQL expression to order by (higher is better), or None when
+    the backend cannot score matches.
+    """
+    term = term.strip()
+    if len(term) < MIN_INDEXED_LENGTH or current_app.config.get("STUDY_SEARCH") == "ilike":
+        return _search_ilike(query, term)
+    backend = _BACKENDS.get(db.engine.dialect.name, _search_ilike)
+    return backend(query, term)
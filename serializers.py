@@ -0,0 +1,82 @@
+# serializers.py
+"""Declarative model-to-dict serializers for API responses.
+
+A Serializer reads attributes by name, so the same one works on ORM objects,
+Row tuples from column-projected queries and the study-config namedtuples.
+Dates and datetimes are left as-is for the JSON provider to encode (see
+json_provider.py), and ``columns(Model)`` returns the columns the serializer
+reads, so list endpoints select exactly those instead of hydrating objects.
+"""
+from operator import attrgetter
+
+
+class Serializer:
+    """Fields are attribute names (dotted paths allowed), ``(key, attr)``
+    renames, or ``(key, callable)`` for values computed from the object
+    (e.g. nested lists).
+    """
+
+    def __init__(self, *fields):
+        self.keys, self.attrs, getters = [], [], []
+        for field in fields:
+            key, source = (field, field) if isinstance(field, str) else field
+            self.keys.append(key)
+            if not callable(source):
+                if not all(part.isidentifier() for part in source.split(".")):
+                    raise ValueError(f"Not an attribute path: {source!r}")
+                self.attrs.append(source)
+                source = attrgetter(source)
+            getters.append((key, source))
+        self.fields = tuple(getters)
+
+    def one(self, obj):
+        return {key: getter(obj) for key, getter in self.fields}
+
+    def many(self, objs):
+        fields = self.fields
+        return [{key: getter(obj) for key, getter in fields} for obj in objs]
+
+    def __call__(self, obj):
+        return self.one(obj)
+
+    def columns(self, model):
+        """Model columns for a projection that this serializer can consume.
+
+        Columns marked ``info={"secret": True}`` (password hashes) are refused,
+        so a list endpoint cannot select one by adding it to a serializer.
+        """
+        columns = [getattr(model, attr) for attr in self.attrs if "." not in attr]
+        secret = [c.key for c in columns if c.expression.info.get("secret")]
+        if secret:
+            raise ValueError(f"Refusing to select secret columns: {', '.join(secret)}")
+        return [c.label(c.key) for c in columns]
+
+
+USER = Serializer("id", "username", "role", "first_name", "last_name", "title")
+SITE = Serializer("id", "name", "location", ("created", "timestamp_created"), ("updated", "timestamp_updated"))
+SITE_BRIEF = Serializer("id", "name")
+STUDY_SITE = Serializer("id", "name", "location")
+STUDY_MEMBER = Serializer("id", "username", "first_name", "last_name", "title", "role")
+ARM = Serializer("id", "name", "description", "allocation_ratio")
+VARIABLE = Serializer("id", "name", "description", "variable_type", "required", "options", "entry_stage")
+
+STUDY = Serializer(
+    "id", "name", "protocol_number", "irb_number", "start_date", "end_date", "created_by", "updated_by",
+    "is_randomized", "randomization_type", "block_size", "stratification_factors",
+    ("sites", lambda s: STUDY_SITE.many(ss.site for ss in s.study_sites)),
+    ("users", lambda s: STUDY_MEMBER.many(s.users)),
+)
+ASSIGNED_STUDY = Serializer("id", "name", "protocol_number", "end_date")
+
+PATIENT = Serializer(
+    "id", "name", "dob", "sex", "para", "phone", "email", "ethnicity", "pregnancy_status", "notes",
+    "consent_date", "enrollment_status", "is_active", "study_id", "site_id"
+)
+PATIENT_VARIABLE = Serializer(
+    "variable_id",
+    ("variable_name", "study_variable.name"),
+    ("variable_description", "study_variable.description"),
+    "value",
+    ("type", "study_variable.variable_type"),
+    ("required", "study_variable.required"),
+)
@@ -0,0 +1,126 @@
+# study_config.py
+"""Cache of mostly static study configuration.
+
+A StudyConfig is an immutable snapshot of a study's randomization settings,
+treatment arms, variables and sites, cached under ``(study_id,
+config_version)``. Every write that changes any of those bumps
+``Study.config_version``. Once that commits, the study's cached version is
+evicted in every worker (see cache.py), so the next lookup reloads. Without
+a shared cache, other workers notice when their short-lived version entry
+expires.
+"""
+import os
+from collections import namedtuple
+
+from sqlalchemy import select, update
+from models import db, Study, TreatmentArm, StudyVariable, StudySite, Site
+from cache import Cache
+
+StudyConfig = namedtuple("StudyConfig", [
+    "id", "version", "name", "created_by", "is_randomized", "randomization_type", "block_size",
+    "stratification_factors", "arms", "variables", "sites"
+])
+ArmConfig = namedtuple("ArmConfig", ["id", "name", "description", "allocation_ratio"])
+VariableConfig = namedtuple("VariableConfig", [
+    "id", "name", "description", "variable_type", "required", "options", "entry_stage"
+])
+SiteConfig = namedtuple("SiteConfig", ["id", "name", "location"])
+
+STUDY_CONFIG_CACHE_SIZE = int(os.environ.get("STUDY_CONFIG_CACHE_SIZE", 512))
+STUDY_VERSION_TTL = int(os.environ.get("STUDY_VERSION_TTL", 10))
+
+# Configs are immutable per version, so only the version entries ever need evicting
+_configs = Cache("study-config", maxsize=STUDY_CONFIG_CACHE_SIZE)
+_versions = Cache("study-config-version", maxsize=STUDY_CONFIG_CACHE_SIZE * 4, ttl=STUDY_VERSION_TTL)
+
+
+def _current_versions(study_ids):
+    versions = {sid: _versions.get(sid) for sid in study_ids}
+    missing = [sid for sid, version in versions.items() if version is None]
+    versions = {sid: version for sid, version in versions.items() if version is not None}
+    if missing:
+        loaded = dict(db.session.execute(
+            select(Study.id, Study.config_version).where(Study.id.in_(missing))
+        ).all())
+        for sid, version in loaded.items():
+            _versions.set(sid, version or 0)
+        versions.update({sid: version or 0 for sid, version in loaded.items()})
+    return versions
+
+
+def _load(versions):
+    """Build configs for ``{study_id: version}`` with one query per table."""
+    ids = list(versions)
+    arms, variables, sites = {}, {}, {}
+
+    for study_id, *fields in db.session.execute(
+        select(TreatmentArm.study_id, TreatmentArm.id, TreatmentArm.name, TreatmentArm.description,
+               TreatmentArm.allocation_ratio)
+        .where(TreatmentArm.study_id.in_(ids)).order_by(TreatmentArm.id)
+    ):
+        arms.setdefault(study_id, []).append(ArmConfig(*fields))
+
+    for study_id, *fields in db.session.execute(
+        select(StudyVariable.study_id, StudyVariable.id, StudyVariable.name, StudyVariable.description,
+               StudyVariable.variable_type, StudyVariable.required, StudyVariable.options, StudyVariable.entry_stage)
+        .where(StudyVariable.study_id.in_(ids)).order_by(StudyVariable.id)
+    ):
+        variables.setdefault(study_id, []).append(VariableConfig(*fields))
+
+    for study_id, *fields in db.session.execute(
+        select(StudySite.study_id, Site.id, Site.name, Site.location)
+        .join(Site, Site.id == StudySite.site_id)
+        .where(StudySite.study_id.in_(ids)).order_by(StudySite.id)
+    ):
+        sites.setdefault(study_id, []).append(SiteConfig(*fields))
+
+    configs = {}
+    for row in db.session.execute(
+        select(Study.id, Study.name, Study.created_by, Study.is_randomized, Study.randomization_type,
+               Study.block_size, Study.stratification_factors)
+        .where(Study.id.in_(ids))
+    ):
+        configs[row.id] = StudyConfig(
+            row.id, versions[row.id], row.name, row.created_by, row.is_randomized, row.randomization_type,
+            row.block_size, row.stratification_factors,
+            tuple(arms.get(row.id, ())), tuple(variables.get(row.id, ())), tuple(sites.get(row.id, ()))
+        )
+    return configs
+
+
+def get_study_configs(study_ids):
+    """``{study_id: StudyConfig}`` for the studies that exist, loading misses in bulk."""
+    versions = _current_versions(list(dict.fromkeys(study_ids)))
+    configs = {sid: _configs.get((sid, v)) for sid, v in versions.items()}
+    missing = {sid: v for sid, v in versions.items() if configs[sid] is None}
+    configs = {sid: config for sid, config in configs.items() if config is not None}
+    if missing:
+        loaded = _load(missing)
+        for sid, config in loaded.items():
+            _configs.set((sid, config.version), config)
+        configs.update(loaded)
+    return configs
+
+
+def get_study_config(study_id):
+    """The StudyConfig of one study, or None if it does not exist."""
+    return get_study_configs([study_id]).get(study_id)
+
+
+def config_version(study_id):
+    """Current config_version of a study, or None if it does not exist. Usually no query."""
+    return _current_versions([study_id]).get(study_id)
+
+
+def bump_config_version(*study_ids):
+    """Invalidate the cached configuration of these studies. Caller commits."""
+    study_ids = [int(sid) for sid in study_ids if sid is not None]
+    if not study_ids:
+        return
+    db.session.execute(
+        update(Study).where(Study.id.in_(study_ids))
+        .values(config_version=Study.config_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    _versions.local.delete(*study_ids)
+    _versions.delete_on_commit(db.session, *study_ids)
@@ -0,0 +1,63 @@
+import os
+
+# Cheap hashes; must be set before passwords.py is imported
+os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+os.environ.pop("CACHE_URL", None)
+os.environ.pop("REDIS_URL", None)
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+import cache
+import randomization_engine
+from app import create_app
+from auth import build_claims
+from models import db, Users
+from passwords import hash_password
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "MIGRATE": False,
+    })
+    with app.app_context():
+        # Enforce foreign keys like PostgreSQL does
+        event.listen(db.engine, "connect", lambda conn, record: conn.execute("PRAGMA foreign_keys=ON"))
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    # Caches are per process, not per app
+    for named in cache._caches.values():
+        named.local.clear()
+    randomization_engine._cluster_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(username, role="admin", password="secret"):
+        with app.app_context():
+            user = Users(username=username, password=hash_password(password), role=role)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def auth_header(app):
+    def auth_header(user_id):
+        with app.app_context():
+            user = db.session.get(Users, user_id)
+            token = create_access_token(identity=str(user.id), additional_claims=build_claims(user))
+        return {"Authorization": f"Bearer {token}"}
+    return auth_header
@@ -0,0 +1,64 @@
+from models import db, Site, Study
+
+
+def _login(client, username, password="secret"):
+    response = client.post("/login", json={"username": username, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.get_json()['token']}"}
+
+
+def test_password_reset_revokes_issued_tokens(client, make_user):
+    make_user("admin")
+    user_id = make_user("alice", role="investigator")
+    admin = _login(client, "admin")
+    old = _login(client, "alice")
+    assert client.get(f"/api/users/{user_id}", headers=old).status_code == 200
+
+    response = client.post(f"/api/users/{user_id}/reset-password", headers=admin, json={"password": "new-secret"})
+    assert response.status_code == 200
+
+    assert client.get(f"/api/users/{user_id}", headers=old).status_code == 401
+    new = _login(client, "alice", "new-secret")
+    assert client.get(f"/api/users/{user_id}", headers=new).status_code == 200
+
+
+def test_change_password_returns_a_fresh_token(client, make_user):
+    make_user("alice", role="investigator")
+    old = _login(client, "alice")
+
+    response = client.post("/change-password", headers=old, json={"oldPassword": "secret", "newPassword": "other"})
+    assert response.status_code == 200
+
+    assert client.post("/change-password", headers=old, json={"oldPassword": "other", "newPassword": "x"}).status_code == 401
+    fresh = {"Authorization": f"Bearer {response.get_json()['token']}"}
+    assert client.get("/api/studies/assigned-studies", headers=fresh).status_code == 200
+
+
+def test_role_change_revokes_issued_tokens(client, make_user):
+    make_user("admin")
+    user_id = make_user("bob", role="admin")
+    admin = _login(client, "admin")
+    old = _login(client, "bob")
+
+    client.post(f"/api/users/{user_id}/update-role", headers=admin, json={"role": "investigator"})
+
+    assert client.get("/api/users/", headers=old).status_code == 401
+
+
+def test_site_links_do_not_revoke_member_tokens(app, client, make_user):
+    admin_id = make_user("admin")
+    member_id = make_user("carol", role="investigator")
+    admin = _login(client, "admin")
+    with app.app_context():
+        study, site = Study(name="Study", created_by=admin_id), Site(name="Site")
+        db.session.add_all([study, site])
+        db.session.commit()
+        link = {"study_id": study.id, "site_id": site.id}
+    client.post("/api/studies/assign-user", headers=admin, json={"study_id": link["study_id"], "user_id": member_id})
+    member = _login(client, "carol")
+
+    assert client.post("/api/studies/assign", headers=admin, json=link).status_code == 201
+    assert client.post("/api/studies/unassign", headers=admin, json=link).status_code == 200
+
+    assert client.get("/api/studies/assigned-studies", headers=member).status_code == 200
+    assert client.get("/api/studies/assigned-studies", headers=admin).status_code == 200
@@ -0,0 +1,80 @@
+import importlib.util
+import pickle
+import time
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import cache
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def _eventually(check, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.fixture
+def workers():
+    """This process's cache module and a second copy standing in for another gunicorn worker,
+    each with its own in-process tiers and listener, sharing one fake Redis server."""
+    spec = importlib.util.spec_from_file_location("cache_other_worker", cache.__file__)
+    other = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(other)
+    event.remove(Session, "after_commit", other._invalidate_after_commit)
+
+    server = fakeredis.FakeServer()
+    for module in (cache, other):
+        module.use_client(fakeredis.FakeRedis(server=server))
+        module.get_client()  # starts the listener
+    probe = fakeredis.FakeRedis(server=server)
+    assert _eventually(lambda: probe.pubsub_numsub(cache.INVALIDATION_CHANNEL)[0][1] == 2)
+
+    yield cache.Cache("shared-test", maxsize=10), other.Cache("shared-test", maxsize=10), probe
+
+    for module in (cache, other):
+        module.use_client(None)
+    cache._caches.pop("shared-test")
+
+
+def test_delete_in_one_worker_evicts_the_other(workers):
+    here, there, _ = workers
+    there.set(1, "old")
+    assert here.get(1) == "old"  # from the shared tier
+
+    here.delete(1)
+
+    assert _eventually(lambda: there.local.get(1) is None)
+    assert there.get(1) is None
+
+
+def test_invalidations_are_json_not_pickle(workers):
+    here, there, probe = workers
+    there.set(1, "kept")
+    there.set(2, "evicted")
+
+    probe.publish(cache.INVALIDATION_CHANNEL, pickle.dumps(("shared-test", (1,))))
+    here.delete(2)
+
+    assert _eventually(lambda: there.local.get(2) is None)
+    assert there.local.get(1) == "kept"
+
+
+def test_deletes_during_an_outage_are_published_once_the_server_is_back(workers, monkeypatch):
+    here, there, _ = workers
+    there.set(1, "old")
+    cache._report(ConnectionError("down"))
+
+    here.delete(1)
+    time.sleep(0.1)
+    assert there.local.get(1) == "old"
+
+    monkeypatch.setattr(cache, "_down_until", 0.0)
+    cache.get_client()
+    assert _eventually(lambda: there.local.get(1) is None)
@@ -0,0 +1,14 @@
+from db_pool import pool_stats
+from models import db
+
+
+def test_pool_stats_follow_the_pool_after_dispose(app):
+    with app.app_context():
+        db.engine.dispose(close=False)  # what a preloaded gunicorn worker does after fork
+        connections = [db.engine.connect() for _ in range(3)]
+        try:
+            assert pool_stats()["pools"][-1]["in_use"] == 3
+        finally:
+            for connection in connections:
+                connection.close()
+        assert pool_stats()["pools"][-1]["in_use"] == 0
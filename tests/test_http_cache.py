@@ -0,0 +1,49 @@
+from models import db, Study
+
+
+def test_member_swap_changes_the_studies_etag(app, client, make_user, auth_header):
+    admin_id = make_user("admin")
+    first, second, third = (make_user(name, role="investigator") for name in ("first", "second", "third"))
+    headers = auth_header(admin_id)
+    with app.app_context():
+        study = Study(name="Study", created_by=admin_id)
+        db.session.add(study)
+        db.session.commit()
+        study_id = study.id
+    for user_id in (first, second):
+        assert client.post("/api/studies/assign-user", headers=headers,
+                           json={"study_id": study_id, "user_id": user_id}).status_code == 201
+
+    response = client.get("/api/studies", headers=headers)
+    etag = response.headers["ETag"]
+    assert client.get("/api/studies", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    # SQLite hands the deleted max study_users id to the next insert
+    client.post("/api/studies/unassign-user", headers=headers, json={"study_id": study_id, "user_id": second})
+    client.post("/api/studies/assign-user", headers=headers, json={"study_id": study_id, "user_id": third})
+
+    response = client.get("/api/studies", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    members = {user["id"] for user in response.get_json()["studies"][0]["users"]}
+    assert members == {first, third}
+
+
+def test_site_swap_changes_the_sites_etag(client, make_user, auth_header):
+    headers = auth_header(make_user("admin"))
+    for name in ("First", "Second"):
+        assert client.post("/api/sites", headers=headers, json={"name": name, "location": "Here"}).status_code == 201
+
+    response = client.get("/api/sites", headers=headers)
+    etag = response.headers["ETag"]
+    assert client.get("/api/sites", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    # SQLite hands the deleted max site id to the next insert, which has no timestamp_updated
+    second = max(site["id"] for site in response.get_json())
+    assert client.delete(f"/api/sites/{second}", headers=headers).status_code == 200
+    assert client.post("/api/sites", headers=headers, json={"name": "Third", "location": "Here"}).status_code == 201
+
+    response = client.get("/api/sites", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert {site["name"] for site in response.get_json()} == {"First", "Third"}
+    # A client without an ETag must not get the old body from the response cache either
+    assert {site["name"] for site in client.get("/api/sites", headers=headers).get_json()} == {"First", "Third"}
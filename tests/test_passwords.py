@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+import passwords
+
+HOLD_SLOT = """
+import fcntl, os, sys
+fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)
+fcntl.flock(fd, fcntl.LOCK_EX)
+print("held", flush=True)
+sys.stdin.read()
+"""
+
+
+@pytest.fixture
+def one_slot(monkeypatch, tmp_path):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_SLOTS", 1)
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_LOCK_DIR", str(tmp_path))
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_WAIT", 0.05)
+    return tmp_path / "slot-0"
+
+
+@contextmanager
+def held_elsewhere(slot):
+    """Another process, like a second gunicorn sync worker, is mid-hash."""
+    holder = subprocess.Popen(
+        [sys.executable, "-c", HOLD_SLOT, str(slot)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert holder.stdout.readline().strip() == "held"
+        yield
+    finally:
+        holder.communicate("")
+
+
+@pytest.mark.skipif(passwords.fcntl is None, reason="slots are per process without fcntl")
+def test_login_is_shed_while_another_process_holds_every_slot(client, make_user, one_slot):
+    make_user("alice")
+    login = {"username": "alice", "password": "secret"}
+
+    with held_elsewhere(one_slot):
+        response = client.post("/login", json=login)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(passwords.PASSWORD_HASH_RETRY_AFTER)
+
+    assert client.post("/login", json=login).status_code == 200
+
+
+def test_slot_is_released_after_each_hash(one_slot):
+    pwhash = passwords.hash_password("secret")
+    assert passwords.verify_password(pwhash, "secret")
+    assert not passwords.verify_password(pwhash, "other")
+
+
+def test_slots_live_under_the_instance_path(app):
+    assert passwords.PASSWORD_HASH_LOCK_DIR == os.path.join(app.instance_path, "password-hash-slots")
+
+
+def test_unusable_slot_files_fall_back_to_a_per_process_limit(client, make_user, one_slot):
+    make_user("alice")
+    one_slot.unlink()
+    one_slot.mkdir()  # os.open() of the slot fails, as for files owned by another user
+
+    assert client.post("/login", json={"username": "alice", "password": "secret"}).status_code == 200
@@ -0,0 +1,52 @@
+import json
+
+from models import db, Patient, Site, Study, StudySite
+
+
+def _study_with_site(app, owner_id):
+    with app.app_context():
+        study = Study(name="Study", created_by=owner_id)
+        linked, other = Site(name="Linked"), Site(name="Other")
+        db.session.add_all([study, linked, other])
+        db.session.flush()
+        db.session.add(StudySite(study_id=study.id, site_id=linked.id, created_by=owner_id))
+        db.session.commit()
+        return study.id, linked.id, other.id
+
+
+def _import(client, headers, study_id, patients):
+    body = "\n".join(json.dumps(p) for p in patients)
+    return client.post(f"/api/patients/bulk?study_id={study_id}&format=ndjson", headers=headers, data=body)
+
+
+def test_bad_patient_fields_are_reported_per_row(app, client, make_user, auth_header):
+    admin_id = make_user("admin")
+    study_id, linked, other = _study_with_site(app, admin_id)
+    base = {"name": "P", "dob": "1980-01-01", "sex": "F", "para": "1", "site_id": linked}
+
+    response = _import(client, auth_header(admin_id), study_id, [
+        base,
+        {**base, "site_id": other},
+        {**base, "site_id": "abc"},
+        {**base, "para": "12345"},
+        {**base, "sex": "x" * 11},
+        {**base, "dob": "01/02/1980"},
+        {**base, "para": 2},
+    ])
+
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body["received"], body["inserted"], body["failed"]) == (7, 2, 5)
+    errors = {e["row"]: e["errors"][0] for e in body["errors"]}
+    assert sorted(errors) == [2, 3, 4, 5, 6]
+    assert "not linked" in errors[2]
+    assert "integer" in errors[3]
+    assert "para" in errors[4] and "sex" in errors[5] and "dob" in errors[6]
+    with app.app_context():
+        assert sorted(p.para for p in Patient.query.filter_by(study_id=study_id)) == ["1", "2"]
+
+
+def test_unknown_study_is_rejected(client, make_user, auth_header):
+    admin_id = make_user("admin")
+    response = _import(client, auth_header(admin_id), 999, [{"name": "P"}])
+    assert response.status_code == 404
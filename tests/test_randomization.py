@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from models import db, AllocationSlot, Study, TreatmentArm
+
+
+def _study(app, owner_id, kind="block", factors=None):
+    with app.app_context():
+        study = Study(name="Study", created_by=owner_id, is_randomized=True, randomization_type=kind,
+                      block_size=4, stratification_factors=json.dumps(factors) if factors else None)
+        db.session.add(study)
+        db.session.flush()
+        db.session.add_all(TreatmentArm(study_id=study.id, name=name, created_by=owner_id) for name in ("A", "B"))
+        db.session.commit()
+        return study.id
+
+
+@pytest.mark.parametrize("slots", ["many", None, 0, -5, 10001, 2.5, True])
+def test_generate_rejects_bad_slot_counts(app, client, make_user, auth_header, slots):
+    admin_id = make_user("admin")
+    study_id = _study(app, admin_id)
+
+    response = client.post(f"/api/randomize/{study_id}/generate", headers=auth_header(admin_id),
+                           json={"slots_per_stratum": slots})
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert AllocationSlot.query.count() == 0
+
+
+def test_generate_caps_slots_across_strata(app, client, make_user, auth_header):
+    admin_id = make_user("admin")
+    factors = {"site": [str(i) for i in range(20)], "sex": ["F", "M"]}
+    study_id = _study(app, admin_id, kind="stratified", factors=factors)
+    url = f"/api/randomize/{study_id}/generate"
+
+    assert client.post(url, headers=auth_header(admin_id), json={"slots_per_stratum": 5000}).status_code == 400
+
+    response = client.post(url, headers=auth_header(admin_id), json={"slots_per_stratum": "8"})
+    assert response.status_code == 201
+    assert response.get_json() == {"strata": 40, "slots_per_stratum": 8}
+
+
+@pytest.mark.parametrize("kind, message", [
+    ("cluster", "Cannot simulate randomization type: cluster"),
+    ("minimization", "Minimization needs at least one stratification factor"),
+])
+def test_simulate_rejects_studies_it_cannot_model(app, make_user, kind, message):
+    study_id = _study(app, make_user("admin"), kind=kind)
+
+    result = app.test_cli_runner().invoke(args=["randomization", "simulate", str(study_id), "--trials", "10"])
+
+    assert result.exit_code == 2
+    assert message in result.output
+    assert result.exception is None or isinstance(result.exception, SystemExit)
+
+
+def test_simulate_block_study(app, make_user):
+    study_id = _study(app, make_user("admin"))
+
+    result = app.test_cli_runner().invoke(args=["randomization", "simulate", str(study_id), "--trials", "10"])
+
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["strategy"] == "block"
@@ -0,0 +1,41 @@
+from flask_migrate import check, upgrade
+from sqlalchemy import inspect, text
+
+from app import create_app
+from models import db, Study
+from search import search_studies, forget_search_indexes
+
+
+def _search(term):
+    query, rank = search_studies(Study.query, term)
+    return [study.name for study in query.all()], rank
+
+
+def test_search_index_created_after_first_search_is_picked_up(app, make_user):
+    admin_id = make_user("admin")
+    with app.app_context():
+        db.session.add_all(Study(name=name, created_by=admin_id) for name in ("Hypertension A", "Diabetes B"))
+        db.session.commit()
+
+        names, rank = _search("tension")
+        assert names == ["Hypertension A"] and rank is None  # ILIKE fallback
+
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE study_fts USING fts5(name, protocol_number, irb_number, "
+                "content='study', content_rowid='id', tokenize='trigram')"
+            ))
+            conn.execute(text("INSERT INTO study_fts(study_fts) VALUES ('rebuild')"))
+        forget_search_indexes(db.engine)
+
+        names, rank = _search("tension")
+        assert names == ["Hypertension A"] and rank is not None  # FTS5, ranked
+
+
+def test_autogenerate_leaves_the_search_index_alone(tmp_path):
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'migrated.db'}", "MIGRATE": True})
+    with app.app_context():
+        upgrade()
+        assert "study_fts" in inspect(db.engine).get_table_names()
+        check()  # exits 1 when autogenerate would drop study_fts*
+        db.engine.dispose()
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+import pytest
+
+from models import Users
+from serializers import Serializer, USER
+
+
+def test_fields_renames_dotted_paths_and_computed_values():
+    serializer = Serializer("id", ("label", "name"), ("kind", "variable.type"), ("twice", lambda o: o.id * 2))
+    obj = SimpleNamespace(id=3, name="x", variable=SimpleNamespace(type="number"))
+
+    assert serializer.one(obj) == {"id": 3, "label": "x", "kind": "number", "twice": 6}
+    assert serializer.many([obj, obj]) == [serializer(obj)] * 2
+
+
+def test_rejects_non_attribute_paths():
+    with pytest.raises(ValueError):
+        Serializer(("bad", "name; import os"))
+
+
+def test_columns_refuses_secret_columns():
+    assert [c.key for c in USER.columns(Users)] == ["id", "username", "role", "first_name", "last_name", "title"]
+    with pytest.raises(ValueError, match="password"):
+        Serializer("id", "password").columns(Users)
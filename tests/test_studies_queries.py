@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import db, Site, Study, StudySite, StudyUser, Users
+
+
+def _add_studies(app, count, owner_id):
+    with app.app_context():
+        now = datetime.utcnow()
+        site_ids = [site.id for site in Site.query.all()]
+        user_ids = [user.id for user in Users.query.all()]
+        for i in range(count):
+            study = Study(name=f"Study {i}", created_by=owner_id, timestamp_created=now, timestamp_updated=now)
+            db.session.add(study)
+            db.session.flush()
+            db.session.add_all(
+                StudySite(study_id=study.id, site_id=site_id, created_by=owner_id) for site_id in site_ids
+            )
+            db.session.add_all(
+                StudyUser(study_id=study.id, user_id=user_id, created_by=owner_id) for user_id in user_ids
+            )
+        db.session.commit()
+
+
+@contextmanager
+def _count_statements(app):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+def _list_statements(app, client, headers):
+    # Warm the per-user caches on another URL, so only the list itself is counted
+    client.get("/api/studies/assigned-studies", headers=headers)
+    with _count_statements(app) as statements:
+        response = client.get("/api/studies?limit=100", headers=headers)
+    assert response.status_code == 200
+    return response.get_json(), len(statements)
+
+
+def test_study_list_statement_count_does_not_grow_with_studies(app, client, make_user, auth_header):
+    admin_id = make_user("admin")
+    for i in range(3):
+        make_user(f"member{i}", role="investigator")
+    with app.app_context():
+        db.session.add_all(Site(name=f"Site {i}") for i in range(3))
+        db.session.commit()
+    headers = auth_header(admin_id)
+
+    _add_studies(app, 2, admin_id)
+    body, few = _list_statements(app, client, headers)
+    assert len(body["studies"]) == 2
+
+    _add_studies(app, 40, admin_id)
+    body, many = _list_statements(app, client, headers)
+    assert len(body["studies"]) == 42
+    assert all(len(study["sites"]) == 3 and len(study["users"]) == 4 for study in body["studies"])
+
+    # ETag validator, page, total, sites (with their Site rows), members
+    assert few == many == 5
+
+
+
+def _query_plans(app, client, url, headers):
+    """EXPLAIN QUERY PLAN of every SELECT the request ran, as one string each."""
+    with _count_statements(app) as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    with app.app_context():
+        conn = db.session.connection()
+        return [
+            " / ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            for statement, parameters in statements if statement.lstrip().upper().startswith("SELECT")
+        ]
+
+
+def _uses(plans, index):
+    return any(f"USING INDEX {index}" in plan or f"USING COVERING INDEX {index}" in plan for plan in plans)
+
+
+def test_filtered_study_lists_use_their_indexes(app, client, make_user, auth_header):
+    admin_id = make_user("admin")
+    manager_id = make_user("manager", role="studymanager")
+    with app.app_context():
+        db.session.add_all(Site(name=f"Site {i}") for i in range(3))
+        db.session.commit()
+    _add_studies(app, 5, admin_id)
+    _add_studies(app, 5, manager_id)
+
+    # A study manager only lists their own studies
+    plans = _query_plans(app, client, "/api/studies?limit=10", auth_header(manager_id))
+    assert _uses(plans, "ix_study_created_by")
+
+    # Keyset pages walk (timestamp_created, id) instead of sorting the table
+    plans = _query_plans(app, client, "/api/studies?cursor=&limit=10", auth_header(admin_id))
+    assert _uses(plans, "ix_study_timestamp_created_id")
+
+    # Assigned studies join from the caller's memberships, then load their configs by study_id
+    plans = _query_plans(app, client, "/api/studies/assigned-studies", auth_header(manager_id))
+    assert _uses(plans, "ix_study_users_user_id")
+    assert _uses(plans, "ix_treatment_arm_study_id")
+    assert _uses(plans, "ix_study_variable_study_id")
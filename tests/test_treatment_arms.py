@@ -0,0 +1,46 @@
+from datetime import date
+
+from models import db, AllocationSlot, Patient, Study, TreatmentArm
+
+
+def _block_study(app, owner_id):
+    with app.app_context():
+        study = Study(name="Study", created_by=owner_id, is_randomized=True, randomization_type="block", block_size=4)
+        db.session.add(study)
+        db.session.flush()
+        arms = [TreatmentArm(study_id=study.id, name=name, created_by=owner_id) for name in ("A", "B")]
+        patient = Patient(study_id=study.id, name="P", dob=date(1980, 1, 1), sex="F", para="0")
+        db.session.add_all([*arms, patient])
+        db.session.commit()
+        return study.id, [arm.id for arm in arms], patient.id
+
+
+def test_arm_with_allocations_cannot_be_deleted(app, client, make_user, auth_header):
+    admin_id = make_user("admin")
+    headers = auth_header(admin_id)
+    study_id, arm_ids, patient_id = _block_study(app, admin_id)
+
+    response = client.post("/api/randomize", headers=headers, json={"study_id": study_id, "patient_id": patient_id})
+    assert response.status_code == 201
+    used = response.get_json()["treatment_arm_id"]
+
+    response = client.delete(f"/api/studies/arms/{used}", headers=headers)
+    assert response.status_code == 400
+    with app.app_context():
+        assert db.session.get(TreatmentArm, used) is not None
+
+
+def test_unused_arm_is_deleted_with_its_pregenerated_slots(app, client, make_user, auth_header):
+    admin_id = make_user("admin")
+    headers = auth_header(admin_id)
+    study_id, arm_ids, _ = _block_study(app, admin_id)
+    assert client.post(f"/api/randomize/{study_id}/generate", headers=headers, json={}).status_code == 201
+
+    response = client.delete(f"/api/studies/arms/{arm_ids[0]}", headers=headers)
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert db.session.get(TreatmentArm, arm_ids[0]) is None
+        assert AllocationSlot.query.filter_by(treatment_arm_id=arm_ids[0]).count() == 0
+    arms = client.get(f"/api/studies/{study_id}/get-arms", headers=headers).get_json()
+    assert [arm["id"] for arm in arms] == arm_ids[1:]